@@ -0,0 +1,249 @@
+"""JSON API served next to the Dash UI on the same Flask server
+
+    GET /api/recommendations/<user_id>?n=10&offset=0
+    GET /api/recommendations?user_ids=1,2,3&n=10
+    GET /api/similar/<movie_id>?n=10&offset=0&mode=content
+    GET /api/similar?movie_ids=1,2,3&n=10&mode=content
+    GET /api/history/<user_id>?limit=10
+    GET /api/stats/<user_id>
+
+Add ``details=1`` to recommendation and similarity requests to include TMDB
+metadata. Responses carry an ETag derived from the model, similarity index
+or history version they were computed from, so clients can revalidate with
+If-None-Match and get 304 Not Modified; the version is checked before any
+scoring or lookups. Unknown /api paths answer a JSON 404.
+"""
+import hashlib
+import json
+import time
+import numpy as np
+from flask import Blueprint, Response, g, request
+from config.config import API_MAX_BATCH, API_MAX_RESULTS, WARMUP_RETRY_AFTER
+from utils.metrics import observe
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+SIMILARITY_MODES = ('content', 'hybrid', 'collaborative')
+
+
+def dumps(payload):
+    if orjson is not None:
+        return orjson.dumps(payload, option=orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(payload, default=lambda value: value.item() if isinstance(value, np.generic) else str(value))
+
+
+class ApiError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def tagged(response, version):
+    """Set the ETag for ``version`` and the request URL"""
+    response.set_etag(hashlib.sha1(repr((version, request.full_path)).encode()).hexdigest()[:20])
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
+def not_modified(version):
+    """304 without a body when the client already holds the ETag for ``version``, else None"""
+    response = tagged(Response(status=304), version)
+    if response.get_etag()[0] in request.if_none_match:
+        return response
+    return None
+
+
+def json_response(payload, version):
+    """A JSON response with an ETag for ``version`` and the request URL"""
+    return tagged(Response(dumps(payload), mimetype='application/json'), version)
+
+
+def int_arg(name, default, minimum=0, maximum=None):
+    value = request.args.get(name, default)
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        raise ApiError(f"'{name}' must be an integer")
+    if value < minimum or (maximum is not None and value > maximum):
+        raise ApiError(f"'{name}' must be between {minimum} and {maximum}")
+    return value
+
+
+def id_list_arg(name):
+    raw = request.args.get(name, '')
+    try:
+        ids = [int(value) for value in raw.split(',') if value.strip()]
+    except ValueError:
+        raise ApiError(f"'{name}' must be a comma-separated list of integers")
+    if not ids:
+        raise ApiError(f"'{name}' is required")
+    if len(ids) > API_MAX_BATCH:
+        raise ApiError(f"at most {API_MAX_BATCH} ids per request")
+    return ids
+
+
+def create_api(services):
+    """Blueprint exposing the models as JSON; register it on ``app.server``
+
+    ``services`` is the app's utils.startup.Warmup holding the models.
+    Endpoints answer 503 with Retry-After until the models they use are ready.
+    """
+    api = Blueprint('api', __name__, url_prefix='/api')
+
+    def movie_items(positions, scores, score_name):
+        items = services.catalog.records(positions)
+        for item, score in zip(items, scores):
+            item[score_name] = round(float(score), 4)
+        if request.args.get('details') in ('1', 'true', 'yes'):
+            infos = services.tmdb_api.get_many([(item['movieId'], item['title']) for item in items])
+            for item, info in zip(items, infos):
+                item.update(info)
+        return items
+
+    def recommendation_version(user_id):
+        serving = services.recommender.serving
+        override = serving.user_overrides.get(user_id)
+        return serving.generation, override['revision'] if override else 0
+
+    def recommendations(user_id, n, offset):
+        positions, scores = services.recommender.rank_items(user_id, offset + n)
+        return {
+            'userId': user_id,
+            'items': movie_items(positions[offset:], scores[offset:], 'predicted_rating'),
+        }
+
+    def require(*steps):
+        if not services.ready(*steps):
+            raise ApiError("warming up, retry shortly", status=503)
+
+    def similarity_model():
+        mode = request.args.get('mode', 'content')
+        if mode not in SIMILARITY_MODES:
+            raise ApiError(f"'mode' must be one of {', '.join(SIMILARITY_MODES)}")
+        require('catalog', mode)
+        return mode, services.similarity_modes[mode]
+
+    def similarity_version(mode):
+        if mode == 'collaborative':
+            return mode, services.recommender.serving.generation
+        return mode, getattr(services.similarity_modes[mode], 'generation', None)
+
+    def similar(model, movie_id, n, offset):
+        movie_idx = services.catalog.position(movie_id)
+        if movie_idx < 0:
+            return {'movieId': movie_id, 'error': 'unknown movie', 'items': []}
+        positions, scores = model.ranked_similar(movie_idx, offset + n)
+        return {
+            'movieId': movie_id,
+            'items': movie_items(positions[offset:], scores[offset:], 'similarity_score'),
+        }
+
+    @api.before_request
+    def start_timer():
+        g.api_started = time.perf_counter()
+
+    @api.after_request
+    def record_latency(response):
+        if 'api_started' in g:
+            observe('request_seconds', time.perf_counter() - g.api_started,
+                    handler=request.endpoint or 'api', status=response.status_code)
+        return response
+
+    @api.errorhandler(ApiError)
+    def handle_api_error(error):
+        response = Response(dumps({'error': str(error)}), status=error.status, mimetype='application/json')
+        if error.status == 503:
+            response.headers['Retry-After'] = str(WARMUP_RETRY_AFTER)
+        return response
+
+    @api.route('/recommendations/<int:user_id>')
+    def user_recommendations(user_id):
+        require('recommender')
+        n = int_arg('n', 10, 1, API_MAX_RESULTS)
+        offset = int_arg('offset', 0, 0, API_MAX_RESULTS)
+        version = recommendation_version(user_id)
+        cached = not_modified(version)
+        if cached is not None:
+            return cached
+        return json_response({'model_version': services.recommender.model_version,
+                              **recommendations(user_id, n, offset)}, version)
+
+    @api.route('/recommendations')
+    def batch_recommendations():
+        require('recommender')
+        user_ids = id_list_arg('user_ids')
+        n = int_arg('n', 10, 1, API_MAX_RESULTS)
+        offset = int_arg('offset', 0, 0, API_MAX_RESULTS)
+        version = [recommendation_version(user_id) for user_id in user_ids]
+        cached = not_modified(version)
+        if cached is not None:
+            return cached
+        results = [recommendations(user_id, n, offset) for user_id in user_ids]
+        return json_response({'model_version': services.recommender.model_version, 'results': results}, version)
+
+    @api.route('/similar/<int:movie_id>')
+    def similar_movies(movie_id):
+        mode, model = similarity_model()
+        n = int_arg('n', 10, 1, API_MAX_RESULTS)
+        offset = int_arg('offset', 0, 0, API_MAX_RESULTS)
+        if services.catalog.position(movie_id) < 0:
+            raise ApiError('unknown movie', status=404)
+        cached = not_modified(similarity_version(mode))
+        if cached is not None:
+            return cached
+        result = similar(model, movie_id, n, offset)
+        return json_response({'mode': mode, **result}, similarity_version(mode))
+
+    @api.route('/similar')
+    def batch_similar_movies():
+        mode, model = similarity_model()
+        movie_ids = id_list_arg('movie_ids')
+        n = int_arg('n', 10, 1, API_MAX_RESULTS)
+        offset = int_arg('offset', 0, 0, API_MAX_RESULTS)
+        cached = not_modified(similarity_version(mode))
+        if cached is not None:
+            return cached
+        results = [similar(model, movie_id, n, offset) for movie_id in movie_ids]
+        return json_response({'mode': mode, 'results': results}, similarity_version(mode))
+
+    @api.route('/history/<int:user_id>')
+    def history(user_id):
+        require('history')
+        limit = int_arg('limit', 10, 1, API_MAX_RESULTS)
+        stats = services.user_history.get_user_stats(user_id)
+        version = (stats['total_movies'], stats['latest_watch'])
+        cached = not_modified(version)
+        if cached is not None:
+            return cached
+        rows = services.user_history.get_user_history(user_id, limit)
+        items = [
+            {
+                'movieId': int(movie_id),
+                'timestamp': int(timestamp),
+                'rating': None if np.isnan(rating) else float(rating),
+                'source': str(source),
+            }
+            for movie_id, timestamp, rating, source
+            in zip(rows['movieId'], rows['timestamp'], rows['rating'], rows['source'])
+        ]
+        return json_response({'userId': user_id, 'items': items}, version)
+
+    @api.route('/stats/<int:user_id>')
+    def stats(user_id):
+        require('history')
+        stats = services.user_history.get_user_stats(user_id)
+        version = (stats['total_movies'], stats['latest_watch'])
+        cached = not_modified(version)
+        if cached is not None:
+            return cached
+        return json_response({'userId': user_id, **stats}, version)
+
+    @api.route('/<path:rest>')
+    def not_found(rest):
+        # Otherwise the request falls through to Dash's catch-all page with 200
+        raise ApiError("not found", status=404)
+
+    return api
@@ -1,14 +1,19 @@
+import os
 import dash
 from dash import html, dcc, Input, Output, State, ALL, callback_context
+from dash.exceptions import PreventUpdate
 import dash_bootstrap_components as dbc
-from dash_bootstrap_templates import ThemeSwitchAIO, load_figure_template
+from dash_bootstrap_templates import ThemeSwitchAIO
 
+# Imported up front: Dash's JSON encoder checks pandas types whenever pandas
+# is in sys.modules, so it must never be seen half-imported by the warm-up
 import pandas as pd
-from models.recommender import MovieRecommender
-from models.similarity import ItemSimilarity
-from models.tmdb_api import TMDBApi
-from models.user_history import UserHistory
+from flask import Response, jsonify
+from api import create_api
+from config.config import RETRAIN_ENABLED, BACKGROUND_WARMUP
+from utils.metrics import registry, metrics_text, timed_request, timer
 from utils.helpers import create_movie_card, create_loading_spinner, create_history_card
+from utils.startup import Warmup
 
 # Get light and Dark themes
 light_css = "./assets/light_styles.css"
@@ -16,22 +21,150 @@ dark_css = "./assets/styles.css"
 
 # Initialize the app
 app = dash.Dash(__name__, external_stylesheets=[dbc.themes.BOOTSTRAP,dark_css])
+# WSGI entry point for gunicorn: gunicorn -c gunicorn.conf.py app:server
+server = app.server
 
-# Load both figure templates (light + dark)
-load_figure_template([light_css, dark_css])
+# ThemeSwitchAIO below registers the Bootstrap figure templates
 
+# Models load on a background thread so the server answers right away.
+# The model modules pull in scipy, scikit-learn and surprise, so they are
+# imported there too.
+services = Warmup()
 
-# Initialize TMDB API
-tmdb_api = TMDBApi()
 
-# Initialize models
-recommender = MovieRecommender(tmdb_api)
-similarity_model = ItemSimilarity(tmdb_api)
-user_history = UserHistory()
+@services.step('catalog')
+def load_catalog():
+    from models.catalog import MovieCatalog
+    from models.ratings import load_rating_columns
+    from models.search import TitleIndex
+    from models.tmdb_api import TMDBApi
+    services.tmdb_api = TMDBApi()
+    catalog = MovieCatalog()
+    catalog.load_data()
+    # Typeahead index; dropdowns only ever receive the top matches
+    services.title_index = TitleIndex(catalog.titles, catalog.count_by_movie(load_rating_columns()['movieId']))
+    services.catalog = catalog
 
-# Load data
-recommender.load_data()
-similarity_model.load_data()
+
+@services.step('history')
+def load_history():
+    from models.user_history import UserHistory
+    services.user_history = UserHistory()
+
+
+@services.step('recommender', requires=['catalog', 'history'])
+def load_recommender():
+    from models.recommender import MovieRecommender
+    from models.search import UserIdIndex
+    recommender = MovieRecommender(services.tmdb_api, services.catalog)
+    recommender.load_data()
+    # Fold app watch history into the model so it counts without retraining
+    for user_id, events in services.user_history.additional_history.groupby('userId'):
+        recommender.fold_in(user_id, events['movieId'].tolist(), events['rating'].tolist())
+    services.user_index = UserIdIndex(recommender.factors.user_ids)
+    services.recommender = recommender
+    services.user_history.subscribe(fold_in_events)
+
+
+def fold_in_events(events):
+    """Fold watches recorded by other worker processes into this one's model"""
+    by_user = {}
+    for user_id, movie_id, _, rating, _ in events:
+        movie_ids, ratings = by_user.setdefault(user_id, ([], []))
+        movie_ids.append(movie_id)
+        ratings.append(rating)
+    for user_id, (movie_ids, ratings) in by_user.items():
+        services.recommender.fold_in(user_id, movie_ids, ratings)
+
+
+# Similarity modes, keyed like the radio items; each loads as its own step
+services.similarity_modes = {}
+
+
+@services.step('content', requires=['catalog'])
+def load_content_similarity():
+    from models.similarity import ItemSimilarity
+    model = ItemSimilarity(services.tmdb_api, services.catalog)
+    model.load_data()
+    services.similarity_modes['content'] = model
+
+
+@services.step('collaborative', requires=['recommender'])
+def load_collaborative_similarity():
+    from models.similarity import FactorSimilarity
+    model = FactorSimilarity(services.tmdb_api, services.catalog, services.recommender)
+    model.load_data()
+    services.similarity_modes['collaborative'] = model
+
+
+@services.step('hybrid', requires=['catalog'])
+def load_hybrid_similarity():
+    from models.similarity import HybridSimilarity
+    model = HybridSimilarity(services.tmdb_api, services.catalog)
+    model.load_data()
+    services.similarity_modes['hybrid'] = model
+
+
+# Periodically retrain on MovieLens + app history and hot-swap the model
+if RETRAIN_ENABLED:
+    @services.step('retrainer', requires=['recommender'])
+    def start_retrainer():
+        from models.retrainer import RetrainScheduler
+        services.retrain_scheduler = RetrainScheduler(services.recommender, services.user_history)
+        services.retrain_scheduler.start()
+
+
+def user_options(user_ids):
+    return [{'label': f"User {i}", 'value': int(i)} for i in user_ids]
+
+
+def movie_options(positions):
+    return [{'label': record['title'], 'value': int(record['movieId'])} for record in services.catalog.records(positions)]
+
+
+def warming_up(*steps):
+    """Placeholder shown until the models behind a view have loaded"""
+    failed = [step for step in steps if services.status.get(step) == 'failed']
+    if failed:
+        return dbc.Alert(f"Could not load {', '.join(failed)}; see the server log.", color="danger", className="mt-4")
+    return html.P("Models are warming up, try again in a moment.", className="text-muted mt-4")
+
+
+# JSON endpoints for machine clients, sharing the models and caches above
+app.server.register_blueprint(create_api(services))
+
+
+def ranking_cache_metrics():
+    caches = {}
+    if services.ready('recommender'):
+        caches['recommendations'] = services.recommender.ranking_cache
+    caches.update((f"similar_{mode}", model.ranking_cache) for mode, model in list(services.similarity_modes.items()))
+    values = []
+    for name, cache in caches.items():
+        for stat, value in cache.stats().items():
+            values.append((f"ranking_cache_{stat}", {'cache': name}, value))
+    return values
+
+
+registry.add_collector(ranking_cache_metrics)
+registry.add_collector(services.metrics)
+
+
+@app.server.route('/metrics')
+def metrics():
+    return Response(metrics_text(), mimetype='text/plain; version=0.0.4')
+
+
+# Liveness: the process is up and serving. Readiness: every model has loaded.
+@app.server.route('/healthz')
+def healthz():
+    return jsonify({'status': 'ok'})
+
+
+@app.server.route('/readyz')
+def readyz():
+    report = services.report()
+    return jsonify(report), 200 if report['ready'] else 503
 
 # Add the toggle switch in your layout for switching between light and dark:
 theme_switch = ThemeSwitchAIO(
@@ -41,110 +174,125 @@ theme_switch = ThemeSwitchAIO(
     icons={"left":"fa fa-moon", "right":"fa fa-sun"}
 )
 
-# Layout
-app.layout = html.Div([
+# Layout, rebuilt on every page load so the dropdowns get their options
+# once the models have warmed up
+def serve_layout():
+    return html.Div([
 
-    dbc.NavbarSimple(
-        brand="Movie Recommender System",
-        brand_href="#",
-        color="dark",
-        dark=True,
-    ),
-    theme_switch,
+        dbc.NavbarSimple(
+            brand="Movie Recommender System",
+            brand_href="#",
+            color="dark",
+            dark=True,
+        ),
+        theme_switch,
     
-    dbc.Container([
-        dbc.Tabs([
-            dbc.Tab(label="User Recommendations", children=[
-                dbc.Row([
-                    dbc.Col([
-                        html.H4("User Selection", className="mt-3"),
-                        dcc.Dropdown(
-                            id='user-dropdown',
-                            options=[{'label': f"User {i}", 'value': i} 
-                                   for i in recommender.ratings_df['userId'].unique()],
-                            value=1
-                        ),
-                        html.H4("Number of Recommendations", className="mt-3"),
-                        dcc.Input(
-                            id='n-recommendations',
-                            type='number',
-                            value=6,
-                            min=1,
-                            max=20
-                        ),
-                        html.Button('Get Recommendations', 
-                                  id='get-recommendations-button', 
-                                  className="mt-3 btn btn-primary"),
+        dbc.Container([
+            dbc.Tabs([
+                dbc.Tab(label="User Recommendations", children=[
+                    dbc.Row([
+                        dbc.Col([
+                            html.H4("User Selection", className="mt-3"),
+                            dcc.Dropdown(
+                                id='user-dropdown',
+                                options=user_options(services.user_index.search('') if services.ready('recommender') else [1]),
+                                placeholder="Type a user id...",
+                                value=1
+                            ),
+                            html.H4("Number of Recommendations", className="mt-3"),
+                            dcc.Input(
+                                id='n-recommendations',
+                                type='number',
+                                value=6,
+                                min=1,
+                                max=20
+                            ),
+                            html.Button('Get Recommendations', 
+                                      id='get-recommendations-button', 
+                                      className="mt-3 btn btn-primary"),
                         
-                        # Watch History Section
-                        html.Hr(className="mt-4"),
-                        html.H4("Watch History", className="mt-3"),
-                        html.P("History Limit", className="mb-2"),
-                        dcc.Input(
-                            id='history-limit',
-                            type='number',
-                            value=6,
-                            min=1,
-                            max=20
-                        ),
-                        html.Button('View History', 
-                                  id='get-history-button', 
-                                  className="mt-3 btn btn-secondary"),
-                    ], width=3),
+                            # Watch History Section
+                            html.Hr(className="mt-4"),
+                            html.H4("Watch History", className="mt-3"),
+                            html.P("History Limit", className="mb-2"),
+                            dcc.Input(
+                                id='history-limit',
+                                type='number',
+                                value=6,
+                                min=1,
+                                max=20
+                            ),
+                            html.Button('View History', 
+                                      id='get-history-button', 
+                                      className="mt-3 btn btn-secondary"),
+                        ], width=3),
                     
-                    dbc.Col([
-                        # Single output div that will show either recommendations OR history
-                        html.Div(id='main-content-output', className="mt-3")
-                    ], width=9)
-                ])
-            ]),
+                        dbc.Col([
+                            # Single output div that will show either recommendations OR history
+                            html.Div(id='main-content-output', className="mt-3")
+                        ], width=9)
+                    ])
+                ]),
             
-            dbc.Tab(label="Item Similarity", children=[
-                dbc.Row([
-                    dbc.Col([
-                        html.H4("Movie Selection", className="mt-3"),
-                        dcc.Dropdown(
-                            id='movie-dropdown',
-                            options=[{'label': row['title'], 'value': row['movieId']} 
-                                   for _, row in recommender.movies_df.iterrows()],
-                            value=1
-                        ),
-                        html.H4("Number of Similar Movies", className="mt-3"),
-                        dcc.Input(
-                            id='n-similar',
-                            type='number',
-                            value=6,
-                            min=1,
-                            max=20
-                        ),
-                        html.Button('Find Similar Movies', 
-                                  id='get-similar-button', 
-                                  className="mt-3 btn btn-primary"),
-                    ], width=3),
-                    dbc.Col([
-                        html.Div(id='similarity-output', className="mt-3")
-                    ], width=9)
+                dbc.Tab(label="Item Similarity", children=[
+                    dbc.Row([
+                        dbc.Col([
+                            html.H4("Movie Selection", className="mt-3"),
+                            dcc.Dropdown(
+                                id='movie-dropdown',
+                                options=movie_options(services.title_index.search('')) if services.ready('catalog') else [],
+                                placeholder="Type a movie title...",
+                                value=1
+                            ),
+                            html.H4("Similarity Mode", className="mt-3"),
+                            dbc.RadioItems(
+                                id='similarity-mode',
+                                options=[
+                                    {'label': "Content (genres)", 'value': 'content'},
+                                    {'label': "Hybrid (genres + tags)", 'value': 'hybrid'},
+                                    {'label': "Collaborative (ratings)", 'value': 'collaborative'},
+                                ],
+                                value='content'
+                            ),
+                            html.H4("Number of Similar Movies", className="mt-3"),
+                            dcc.Input(
+                                id='n-similar',
+                                type='number',
+                                value=6,
+                                min=1,
+                                max=20
+                            ),
+                            html.Button('Find Similar Movies', 
+                                      id='get-similar-button', 
+                                      className="mt-3 btn btn-primary"),
+                        ], width=3),
+                        dbc.Col([
+                            html.Div(id='similarity-output', className="mt-3")
+                        ], width=9)
+                    ])
                 ])
             ])
-        ])
-    ], className="mt-4"),
+        ], className="mt-4"),
     
-    # Hidden div to store current user for watch buttons
-    html.Div(id='current-user', style={'display': 'none'}),
+        # Hidden div to store current user for watch buttons
+        html.Div(id='current-user', style={'display': 'none'}),
     
-    # Toast for notifications
-    dbc.Toast(
-        id="watch-toast",
-        header="Movie Added to History!",
-        is_open=False,
-        dismissable=True,
-        duration=3000,
-        icon="success",
-        style={"position": "fixed", "top": 66, "right": 10, "width": 350, "z-index": 1},
-    ),
+        # Toast for notifications
+        dbc.Toast(
+            id="watch-toast",
+            header="Movie Added to History!",
+            is_open=False,
+            dismissable=True,
+            duration=3000,
+            icon="success",
+            style={"position": "fixed", "top": 66, "right": 10, "width": 350, "z-index": 1},
+        ),
     
-    create_loading_spinner()
-])
+        create_loading_spinner()
+    ])
+
+
+app.layout = serve_layout
 
 # Client-side callback for Bootstrap color mode switching
 app.clientside_callback(
@@ -162,6 +310,37 @@ app.clientside_callback(
 )
 
 
+# Server-side typeahead: replace the dropdown options with the best matches
+@app.callback(
+    Output('user-dropdown', 'options'),
+    Input('user-dropdown', 'search_value'),
+    State('user-dropdown', 'value')
+)
+def search_users(search_value, value):
+    if search_value is None or not services.ready('recommender'):
+        raise PreventUpdate
+    user_ids = list(services.user_index.search(search_value))
+    # Keep the current selection so its label stays visible
+    if value is not None and value not in user_ids:
+        user_ids.append(value)
+    return user_options(user_ids)
+
+
+@app.callback(
+    Output('movie-dropdown', 'options'),
+    Input('movie-dropdown', 'search_value'),
+    State('movie-dropdown', 'value')
+)
+def search_movies(search_value, value):
+    if search_value is None or not services.ready('catalog'):
+        raise PreventUpdate
+    positions = list(services.title_index.search(search_value))
+    selected = services.catalog.position(value) if value is not None else -1
+    if selected >= 0 and selected not in positions:
+        positions.append(selected)
+    return movie_options(positions)
+
+
 # Store current user when recommendations are loaded
 @app.callback(
     Output('current-user', 'children'),
@@ -181,6 +360,7 @@ def store_current_user(rec_clicks, hist_clicks, user_id):
      State('n-recommendations', 'value'),
      State('history-limit', 'value')]
 )
+@timed_request('update_main_content')
 def update_main_content(rec_clicks, hist_clicks, user_id, n_recommendations, history_limit):
     ctx = callback_context
     
@@ -191,18 +371,23 @@ def update_main_content(rec_clicks, hist_clicks, user_id, n_recommendations, his
     trigger_id = ctx.triggered[0]['prop_id'].split('.')[0]
     
     if trigger_id == 'get-recommendations-button' and rec_clicks:
+        if not services.ready('recommender'):
+            return warming_up('recommender')
         # Show recommendations only
-        recommendations = recommender.get_top_n_recommendations(user_id, n_recommendations or 6)
+        recommendations = services.recommender.get_top_n_recommendations(user_id, n_recommendations or 6)
         
-        return html.Div([
-            html.H4("Recommended Movies", className="mb-4"),
-            dbc.Row([
-                dbc.Col(create_movie_card(movie), width=4)
-                for movie in recommendations
+        with timer('stage_seconds', stage='render'):
+            return html.Div([
+                html.H4("Recommended Movies", className="mb-4"),
+                dbc.Row([
+                    dbc.Col(create_movie_card(movie), width=4)
+                    for movie in recommendations
+                ])
             ])
-        ])
     
     elif trigger_id == 'get-history-button' and hist_clicks:
+        if not services.ready('catalog', 'history'):
+            return warming_up('catalog', 'history')
         # Show history only
         return get_user_history_display(user_id, history_limit or 6)
     
@@ -212,22 +397,33 @@ def update_main_content(rec_clicks, hist_clicks, user_id, n_recommendations, his
     Output('similarity-output', 'children'),
     [Input('get-similar-button', 'n_clicks')],
     [State('movie-dropdown', 'value'),
-     State('n-similar', 'value')]
+     State('n-similar', 'value'),
+     State('similarity-mode', 'value')]
 )
-def update_similar_movies(n_clicks, movie_id, n):
+@timed_request('update_similar_movies')
+def update_similar_movies(n_clicks, movie_id, n, mode):
     if n_clicks is None:
         return html.P("Select a movie and click 'Find Similar Movies' to see recommendations.", 
                      className="text-muted")
     
-    similar_movies = similarity_model.get_similar_movies(movie_id, n)
+    mode = mode if mode in services.status else 'content'
+    if not services.ready(mode):
+        return warming_up(mode)
+    similar_movies = services.similarity_modes[mode].get_similar_movies(movie_id, n)
+    if not similar_movies:
+        if mode == 'collaborative':
+            return html.P("Not enough ratings for this movie to find similar ones. Try the content mode.",
+                         className="text-muted")
+        return html.P("No similar movies found.", className="text-muted")
     
-    return [
-        html.H4("Similar Movies", className="mb-4"),
-        dbc.Row([
-            dbc.Col(create_movie_card(movie, show_watch_button=False), width=4)
-            for movie in similar_movies
-        ])
-    ]
+    with timer('stage_seconds', stage='render'):
+        return [
+            html.H4("Similar Movies", className="mb-4"),
+            dbc.Row([
+                dbc.Col(create_movie_card(movie, show_watch_button=False), width=4)
+                for movie in similar_movies
+            ])
+        ]
 
 # Handle watch button clicks
 @app.callback(
@@ -238,8 +434,9 @@ def update_similar_movies(n_clicks, movie_id, n):
      State('history-limit', 'value')],
     prevent_initial_call=True
 )
+@timed_request('handle_watch_button')
 def handle_watch_button(n_clicks_list, current_user, history_limit):
-    if not any(n_clicks_list) or not current_user:
+    if not any(n_clicks_list) or not current_user or not services.ready('recommender'):
         return False, dash.no_update
     
     # Get which button was clicked
@@ -251,11 +448,12 @@ def handle_watch_button(n_clicks_list, current_user, history_limit):
     button_id = ctx.triggered[0]['prop_id']
     movie_id = eval(button_id.split('.')[0])['index']
     
-    # Add to user history
-    user_history.add_to_history(current_user, movie_id)
+    # Add to user history and update the user's factors right away
+    services.user_history.add_to_history(current_user, movie_id)
+    services.recommender.fold_in(current_user, [movie_id])
     
     # Keep showing recommendations (don't switch to history)
-    recommendations = recommender.get_top_n_recommendations(current_user, 6)
+    recommendations = services.recommender.get_top_n_recommendations(current_user, 6)
     updated_content = html.Div([
         html.H4("Recommended Movies", className="mb-4"),
         dbc.Row([
@@ -268,7 +466,8 @@ def handle_watch_button(n_clicks_list, current_user, history_limit):
 
 def get_user_history_display(user_id, limit):
     """Helper function to generate history display"""
-    history = user_history.get_user_history(user_id, limit)
+    from models.user_history import format_timestamp
+    history = services.user_history.get_user_history(user_id, limit)
     
     if history.empty:
         return html.Div([
@@ -280,26 +479,26 @@ def get_user_history_display(user_id, limit):
         ])
     
     # Get user stats
-    stats = user_history.get_user_stats(user_id)
+    stats = services.user_history.get_user_stats(user_id)
     
+    # Get movie details
+    positions = services.catalog.positions(history['movieId'])
+    history = history[positions >= 0]
+    movies = services.catalog.records(positions[positions >= 0])
+    tmdb_infos = services.tmdb_api.get_many([(movie['movieId'], movie['title']) for movie in movies])
+
     history_movies = []
-    for _, record in history.iterrows():
-        # Get movie details
-        movie_info = recommender.movies_df[recommender.movies_df['movieId'] == record['movieId']]
-        if not movie_info.empty:
-            movie_data = movie_info.iloc[0]
-            tmdb_info = tmdb_api.search_movie(movie_data['title'])
-            
-            movie_details = {
-                'movieId': record['movieId'],
-                'title': movie_data['title'],
-                'genres': movie_data['genres'],
-                'watched_on': record['timestamp'],
-                'user_rating': record['rating'] if pd.notna(record['rating']) else None,
-                'source': record.get('source', 'unknown'),
-                **tmdb_info
-            }
-            history_movies.append(movie_details)
+    for (_, record), movie_data, tmdb_info in zip(history.iterrows(), movies, tmdb_infos):
+        movie_details = {
+            'movieId': movie_data['movieId'],
+            'title': movie_data['title'],
+            'genres': movie_data['genres'],
+            'watched_on': format_timestamp(record['timestamp']),
+            'user_rating': record['rating'] if pd.notna(record['rating']) else None,
+            'source': record.get('source', 'unknown'),
+            **tmdb_info
+        }
+        history_movies.append(movie_details)
     
     return html.Div([
         html.H4(f"Watch History for User {user_id}", className="mb-3"),
@@ -352,4 +551,11 @@ def get_user_history_display(user_id, limit):
     ])
 
 if __name__ == '__main__':
+    # Loading starts here and in gunicorn.conf.py only: spawned worker
+    # processes (retraining, the hybrid index build) re-import this file as
+    # __mp_main__ and must not load the models again. With debug=True
+    # Werkzeug's reloader runs this file twice: the watching parent never
+    # serves requests, so only the child it starts (WERKZEUG_RUN_MAIN) loads
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        services.start(background=BACKGROUND_WARMUP)
     app.run_server(debug=True)
\ No newline at end of file
@@ -0,0 +1,218 @@
+"""Benchmark cases, each run in its own process by benchmarks.run
+
+The working directory must contain the (synthetic) ``data/`` folder, since
+every path in config.config is relative. Prints one JSON line with the
+latency percentiles of every timed operation and the peak RSS.
+
+    python -m benchmarks.cases <case> [--iterations 200] [--seed 0]
+"""
+import argparse
+import json
+import os
+import resource
+import sys
+import time
+import numpy as np
+
+CASES = {}
+
+
+def case(function):
+    CASES[function.__name__] = function
+    return function
+
+
+class Timings(dict):
+    def time(self, name, function, *args, **kwargs):
+        started = time.perf_counter()
+        result = function(*args, **kwargs)
+        self.setdefault(name, []).append(time.perf_counter() - started)
+        return result
+
+
+def summarize(samples):
+    ms = np.asarray(samples) * 1000
+    return {
+        'n': len(ms),
+        'mean_ms': round(float(ms.mean()), 3),
+        'p50_ms': round(float(np.percentile(ms, 50)), 3),
+        'p90_ms': round(float(np.percentile(ms, 90)), 3),
+        'p99_ms': round(float(np.percentile(ms, 99)), 3),
+        'max_ms': round(float(ms.max()), 3),
+    }
+
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def load_catalog():
+    from models.catalog import MovieCatalog
+    catalog = MovieCatalog()
+    catalog.load_data()
+    return catalog
+
+
+@case
+def startup(timings, iterations, rng):
+    """Import app.py, serve the first page, then wait for every model to load"""
+    app = timings.time('import_app', __import__, 'app')
+    app.services.start()
+    client = app.app.server.test_client()
+    timings.time('first_page', client.get, '/')
+    timings.time('warmup', app.services.wait)
+    if not app.services.ready():
+        raise RuntimeError(f"warm-up failed: {app.services.report()}")
+
+
+@case
+def recommender_load(timings, iterations, rng):
+    from models.recommender import MovieRecommender
+    catalog = timings.time('catalog_load', load_catalog)
+    recommender = MovieRecommender(None, catalog)
+    timings.time('recommender_load', recommender.load_data)
+
+
+@case
+def recommendations(timings, iterations, rng):
+    from models.recommender import MovieRecommender
+    from models.tmdb_api import TMDBApi
+    catalog = load_catalog()
+    recommender = MovieRecommender(TMDBApi(), catalog)
+    recommender.load_data()
+    user_ids = recommender.factors.user_ids
+    for _ in range(iterations):
+        user_id = rng.choice(user_ids)
+        timings.time('rank_items', recommender.rank_items, user_id, 12)
+        # Folding in nothing new must leave the user's ranking as trained
+        before = recommender.rank_items(user_id, 12)[0]
+        timings.time('fold_in', recommender.fold_in, user_id, [])
+        if not np.array_equal(recommender.rank_items(user_id, 12)[0], before):
+            raise RuntimeError(f"fold_in without new interactions changed user {user_id}'s ranking")
+        timings.time('get_top_n_recommendations', recommender.get_top_n_recommendations,
+                     user_id, 6, offset=int(rng.choice([0, 6])))
+
+
+@case
+def similarity_load(timings, iterations, rng):
+    from config.config import HYBRID_SIMILARITY_FILE
+    from models.similarity import ItemSimilarity, HybridSimilarity
+    catalog = load_catalog()
+    timings.time('content_load', ItemSimilarity(None, catalog).load_data)
+    if os.path.exists(HYBRID_SIMILARITY_FILE):
+        os.remove(HYBRID_SIMILARITY_FILE)
+    timings.time('hybrid_build', HybridSimilarity(None, catalog).load_data)
+    timings.time('hybrid_load', HybridSimilarity(None, catalog).load_data)
+
+
+@case
+def similar_movies(timings, iterations, rng):
+    from models.recommender import MovieRecommender
+    from models.similarity import ItemSimilarity, HybridSimilarity, FactorSimilarity
+    from models.tmdb_api import TMDBApi
+    catalog = load_catalog()
+    tmdb_api = TMDBApi()
+    recommender = MovieRecommender(tmdb_api, catalog)
+    recommender.load_data()
+    modes = {
+        'content': ItemSimilarity(tmdb_api, catalog),
+        'hybrid': HybridSimilarity(tmdb_api, catalog),
+        'collaborative': FactorSimilarity(tmdb_api, catalog, recommender),
+    }
+    for mode, model in modes.items():
+        timings.time(f'{mode}_load', model.load_data)
+    for _ in range(iterations):
+        movie_id = rng.choice(catalog.movie_ids)
+        for mode, model in modes.items():
+            timings.time(f'{mode}_get_similar_movies', model.get_similar_movies, movie_id, 6)
+
+
+@case
+def history(timings, iterations, rng):
+    from models.user_history import UserHistory
+    user_history = timings.time('history_load', UserHistory)
+    user_ids = np.fromiter(user_history.index.user_rows, dtype=np.int64)
+    movie_ids = load_catalog().movie_ids
+    for _ in range(iterations):
+        user_id = int(rng.choice(user_ids))
+        timings.time('add_to_history', user_history.add_to_history, user_id, int(rng.choice(movie_ids)))
+        timings.time('get_user_history', user_history.get_user_history, user_id, 6)
+        timings.time('get_user_stats', user_history.get_user_stats, user_id)
+    timings.time('flush', user_history.flush)
+
+
+def dash_payload(app, output, inputs, state, changed):
+    """Request body for /_dash-update-component, as the browser sends it"""
+    spec = app.callback_map[output]
+    outputs = spec['output'] if isinstance(spec['output'], list) else [spec['output']]
+    outputs = [{'id': o.component_id, 'property': o.component_property} for o in outputs]
+    return {
+        'output': output,
+        'outputs': outputs if len(outputs) > 1 else outputs[0],
+        'inputs': inputs,
+        'state': [{**item, 'value': state[item['id']]} for item in spec['state']],
+        'changedPropIds': changed,
+    }
+
+
+@case
+def callbacks(timings, iterations, rng):
+    """End-to-end Dash callback requests through the Flask test client"""
+    import app
+    app.services.start().wait()
+    client = app.app.server.test_client()
+    watch_output = next(key for key in app.app.callback_map if 'watch-toast' in key)
+    user_ids = app.services.recommender.factors.user_ids
+    movie_ids = app.services.catalog.movie_ids
+
+    def post(name, payload):
+        response = timings.time(name, client.post, '/_dash-update-component', json=payload)
+        if response.status_code not in (200, 204):
+            raise RuntimeError(f"{name}: HTTP {response.status_code} {response.get_data(as_text=True)[:200]}")
+
+    for _ in range(iterations):
+        user_id = int(rng.choice(user_ids))
+        state = {'user-dropdown': user_id, 'n-recommendations': 6, 'history-limit': 6}
+        buttons = [{'id': 'get-recommendations-button', 'property': 'n_clicks', 'value': 1},
+                   {'id': 'get-history-button', 'property': 'n_clicks', 'value': None}]
+        post('update_main_content_recommendations', dash_payload(
+            app.app, 'main-content-output.children', buttons, state, ['get-recommendations-button.n_clicks']))
+
+        buttons = [{'id': 'get-recommendations-button', 'property': 'n_clicks', 'value': None},
+                   {'id': 'get-history-button', 'property': 'n_clicks', 'value': 1}]
+        post('update_main_content_history', dash_payload(
+            app.app, 'main-content-output.children', buttons, state, ['get-history-button.n_clicks']))
+
+        movie_id = int(rng.choice(movie_ids))
+        watch = [[{'id': {'index': movie_id, 'type': 'watch-button'}, 'property': 'n_clicks', 'value': 1}]]
+        post('handle_watch_button', dash_payload(
+            app.app, watch_output, watch, {'current-user': user_id, 'history-limit': 6},
+            [json.dumps({'index': movie_id, 'type': 'watch-button'}, separators=(',', ':')) + '.n_clicks']))
+
+        state = {'movie-dropdown': movie_id, 'n-similar': 6, 'similarity-mode': str(rng.choice(list(app.services.similarity_modes)))}
+        post('update_similar_movies', dash_payload(
+            app.app, 'similarity-output.children', [{'id': 'get-similar-button', 'property': 'n_clicks', 'value': 1}],
+            state, ['get-similar-button.n_clicks']))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('case', choices=sorted(CASES))
+    parser.add_argument('--iterations', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    # Benchmarks never retrain in the background
+    os.environ.setdefault('RETRAIN_ENABLED', '0')
+    sys.path.insert(0, os.getcwd())
+    timings = Timings()
+    CASES[args.case](timings, args.iterations, np.random.default_rng(args.seed))
+    result = {'metrics': {name: summarize(samples) for name, samples in timings.items()},
+              'peak_rss_mb': peak_rss_mb()}
+    print(json.dumps(result))
+
+
+if __name__ == '__main__':
+    main()
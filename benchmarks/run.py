@@ -0,0 +1,174 @@
+"""Run the benchmark suite offline and write or compare a JSON baseline
+
+Generates synthetic MovieLens-shaped data at the requested scale (cached
+under --workdir), starts a local TMDB stub and runs every case in a fresh
+process from that directory. Each run starts cold: trained models, caches
+and app history from the previous run are removed first.
+
+    python -m benchmarks.run [--scale 1] [--iterations 200] [--output benchmarks/results.json]
+    python -m benchmarks.run --compare benchmarks/baseline.json [--threshold 0.2]
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import time
+import numpy as np
+from benchmarks.synthetic import generate
+from benchmarks.tmdb_stub import StubServer
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CASES = ['startup_cold', 'startup', 'recommender_load', 'recommendations', 'similarity_load',
+         'similar_movies', 'history', 'callbacks']
+# Files and directories each run starts without
+RUN_STATE = ['model', 'cache', 'tmdb_cache.sqlite3', 'tmdb_cache.sqlite3-wal', 'tmdb_cache.sqlite3-shm']
+
+
+def prepare_workdir(workdir, scale, seed):
+    data_dir = os.path.join(workdir, 'data')
+    marker = os.path.join(data_dir, 'synthetic.json')
+    if not os.path.exists(marker):
+        print(f"Generating scale {scale} data in {data_dir}...")
+        info = generate(data_dir, scale, seed)
+        with open(marker, 'w') as f:
+            json.dump({'scale': scale, 'seed': seed, **info}, f)
+    with open(marker) as f:
+        info = json.load(f)
+
+    for name in RUN_STATE:
+        path = os.path.join(data_dir, name)
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+        elif os.path.exists(path):
+            os.remove(path)
+    with open(os.path.join(data_dir, 'user_history.csv'), 'w') as f:
+        f.write('userId,movieId,timestamp,rating,source\n')
+    return info
+
+
+def run_case(name, workdir, env, iterations, seed):
+    case = 'startup' if name == 'startup_cold' else name
+    command = [sys.executable, '-m', 'benchmarks.cases', case, '--iterations', str(iterations), '--seed', str(seed)]
+    started = time.perf_counter()
+    completed = subprocess.run(command, cwd=workdir, env=env, capture_output=True, text=True)
+    wall = time.perf_counter() - started
+    if completed.returncode != 0:
+        raise RuntimeError(f"case {name} failed:\n{completed.stderr[-2000:]}")
+    result = json.loads(completed.stdout.strip().splitlines()[-1])
+    result['process_seconds'] = round(wall, 3)
+    return result
+
+
+def run_suite(args):
+    workdir = os.path.abspath(os.path.join(args.workdir, f"scale-{args.scale:g}"))
+    dataset = prepare_workdir(workdir, args.scale, args.seed)
+    stub = StubServer(latency_ms=args.latency_ms).start()
+    env = {
+        **os.environ,
+        'PYTHONPATH': REPO_ROOT + os.pathsep + os.environ.get('PYTHONPATH', ''),
+        'TMDB_BASE_URL': stub.url,
+        'TMDB_API_KEY': 'benchmark',
+        'TMDB_OFFLINE': '0',
+        'RETRAIN_ENABLED': '0',
+    }
+
+    # Every run starts cold, so startup_cold always runs first to train
+    # and cache what the other cases load
+    cases = ['startup_cold'] + [name for name in args.cases if name != 'startup_cold']
+    results = {}
+    try:
+        for name in cases:
+            print(f"Running {name}...", flush=True)
+            results[name] = run_case(name, workdir, env, args.iterations, args.seed)
+    finally:
+        stub.stop()
+
+    return {
+        'meta': {
+            'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'git_commit': git_commit(),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'iterations': args.iterations,
+            'seed': args.seed,
+            'tmdb_latency_ms': args.latency_ms,
+            'tmdb_calls': stub.calls,
+            'dataset': dataset,
+        },
+        'results': results,
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_ROOT,
+                              capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def flatten(report):
+    """{(case, metric): value} for every comparable number in a report"""
+    values = {}
+    for case_name, result in report['results'].items():
+        values[(case_name, 'process_seconds')] = result['process_seconds']
+        values[(case_name, 'peak_rss_mb')] = result['peak_rss_mb']
+        for metric, summary in result['metrics'].items():
+            for stat in ('p50_ms', 'p90_ms', 'p99_ms'):
+                values[(case_name, f"{metric}.{stat}")] = summary[stat]
+    return values
+
+
+def compare(current, baseline, threshold):
+    """Print current vs baseline and return the regressions above ``threshold``"""
+    current_values, baseline_values = flatten(current), flatten(baseline)
+    regressions = []
+    print(f"{'case':<20} {'metric':<48} {'baseline':>10} {'current':>10} {'change':>8}")
+    for key in sorted(current_values):
+        if key not in baseline_values:
+            continue
+        before, after = baseline_values[key], current_values[key]
+        change = (after - before) / before if before else 0.0
+        flag = ''
+        # Ignore sub-millisecond noise on tiny timings
+        if change > threshold and after - before > 0.5:
+            flag = '  REGRESSION'
+            regressions.append(key)
+        print(f"{key[0]:<20} {key[1]:<48} {before:>10.3f} {after:>10.3f} {change:>+8.1%}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scale', type=float, default=1.0, help="1 = ml-latest-small, 250 = ml-25m")
+    parser.add_argument('--iterations', type=int, default=200, help="timed calls per operation")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--latency-ms', type=float, default=20, help="simulated TMDB latency")
+    parser.add_argument('--cases', nargs='+', default=CASES, choices=CASES)
+    parser.add_argument('--workdir', default=os.path.join(REPO_ROOT, 'benchmarks', 'work'))
+    parser.add_argument('--output', default=os.path.join(REPO_ROOT, 'benchmarks', 'results.json'))
+    parser.add_argument('--compare', metavar='BASELINE', help="baseline JSON to compare against")
+    parser.add_argument('--threshold', type=float, default=0.2, help="relative slowdown that counts as a regression")
+    args = parser.parse_args()
+
+    report = run_suite(args)
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.threshold)
+        if regressions:
+            print(f"{len(regressions)} regressions above {args.threshold:.0%}")
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+"""MovieLens-shaped synthetic data at a chosen scale
+
+Scale 1 matches ml-latest-small (~100k ratings, 610 users, ~9.7k movies);
+scale 250 is ml-25m sized (~25M ratings, ~150k users, ~60k movies). Movie
+popularity and user activity are heavy-tailed like the real data, and the
+files have the same columns, so the app loads them unchanged.
+"""
+import os
+import numpy as np
+import pandas as pd
+
+GENRES = ['Action', 'Adventure', 'Animation', 'Children', 'Comedy', 'Crime', 'Documentary', 'Drama',
+          'Fantasy', 'Film-Noir', 'Horror', 'IMAX', 'Musical', 'Mystery', 'Romance', 'Sci-Fi',
+          'Thriller', 'War', 'Western']
+BASE_RATINGS = 100836
+BASE_USERS = 610
+BASE_MOVIES = 9742
+FIRST_TIMESTAMP = 828000000  # 1996
+LAST_TIMESTAMP = 1537000000  # 2018
+
+
+def dataset_size(scale):
+    """(n_ratings, n_users, n_movies) for a scale factor"""
+    return (int(BASE_RATINGS * scale), max(20, int(BASE_USERS * scale)),
+            max(50, int(BASE_MOVIES * scale ** (1 / 3))))
+
+
+def generate_movies(n_movies, rng):
+    movie_ids = np.cumsum(rng.integers(1, 4, n_movies))
+    years = rng.integers(1920, 2019, n_movies)
+    n_genres = rng.integers(1, 4, n_movies)
+    genre_weights = rng.dirichlet(np.ones(len(GENRES)))
+    genres = ['|'.join(rng.choice(GENRES, size=k, replace=False, p=genre_weights)) for k in n_genres]
+    titles = [f"Synthetic Movie {i} ({year})" for i, year in zip(movie_ids, years)]
+    return pd.DataFrame({'movieId': movie_ids, 'title': titles, 'genres': genres})
+
+
+def generate_ratings(n_ratings, n_users, movie_ids, rng, chunk_size=5_000_000):
+    """Yield rating DataFrames in chunks over disjoint user ranges
+
+    Each (userId, movieId) pair occurs at most once. Pairs are oversampled
+    and deduplicated, so the total can end slightly below ``n_ratings``.
+    """
+    popularity = 1 / (np.arange(len(movie_ids)) + 10.0)
+    popularity = popularity[rng.permutation(len(movie_ids))]
+    popularity /= popularity.sum()
+    activity = rng.lognormal(0, 1.2, n_users)
+    activity /= activity.sum()
+    user_bias = rng.normal(0, 0.4, n_users)
+    movie_bias = rng.normal(0, 0.5, len(movie_ids))
+
+    for group in np.array_split(np.arange(n_users), max(1, -(-n_ratings // chunk_size))):
+        share = activity[group].sum()
+        target = int(round(n_ratings * share))
+        users = rng.choice(group, int(target * 1.5), p=activity[group] / share)
+        movies = rng.choice(len(movie_ids), len(users), p=popularity)
+        pairs = np.unique(users.astype(np.int64) * len(movie_ids) + movies)
+        if len(pairs) > target:
+            pairs = np.sort(rng.choice(pairs, target, replace=False))
+        users, movies = pairs // len(movie_ids), pairs % len(movie_ids)
+        ratings = 3.5 + user_bias[users] + movie_bias[movies] + rng.normal(0, 0.8, len(pairs))
+        ratings = np.clip(np.round(ratings * 2) / 2, 0.5, 5.0)
+        timestamps = rng.integers(FIRST_TIMESTAMP, LAST_TIMESTAMP, len(pairs))
+        yield pd.DataFrame({'userId': users + 1, 'movieId': movie_ids[movies],
+                            'rating': ratings, 'timestamp': timestamps})
+
+
+def generate_tags(n_tags, n_users, movie_ids, rng, vocabulary_size=500):
+    words = np.array([f"tag{i}" for i in range(vocabulary_size)])
+    word_weights = 1 / (np.arange(vocabulary_size) + 1.0)
+    return pd.DataFrame({
+        'userId': rng.integers(1, n_users + 1, n_tags),
+        'movieId': rng.choice(movie_ids, n_tags),
+        'tag': rng.choice(words, n_tags, p=word_weights / word_weights.sum()),
+        'timestamp': rng.integers(FIRST_TIMESTAMP, LAST_TIMESTAMP, n_tags),
+    })
+
+
+def generate(directory, scale=1.0, seed=0):
+    """Write movies, ratings, tags, links and an empty history to ``directory``"""
+    rng = np.random.default_rng(seed)
+    n_ratings, n_users, n_movies = dataset_size(scale)
+    os.makedirs(directory, exist_ok=True)
+
+    movies = generate_movies(n_movies, rng)
+    movies.to_csv(os.path.join(directory, 'movies.csv'), index=False)
+    movie_ids = movies['movieId'].to_numpy()
+
+    pd.DataFrame({'movieId': movie_ids, 'imdbId': movie_ids + 100000, 'tmdbId': movie_ids + 200000}).to_csv(
+        os.path.join(directory, 'links.csv'), index=False)
+
+    ratings_path = os.path.join(directory, 'ratings.csv')
+    tmp_path = ratings_path + '.tmp'
+    for i, chunk in enumerate(generate_ratings(n_ratings, n_users, movie_ids, rng)):
+        chunk.to_csv(tmp_path, mode='w' if i == 0 else 'a', header=i == 0, index=False)
+    os.replace(tmp_path, ratings_path)
+
+    generate_tags(max(1, n_ratings // 27), n_users, movie_ids, rng).to_csv(
+        os.path.join(directory, 'tags.csv'), index=False)
+    with open(os.path.join(directory, 'user_history.csv'), 'w') as f:
+        f.write('userId,movieId,timestamp,rating,source\n')
+    return {'n_ratings': n_ratings, 'n_users': n_users, 'n_movies': n_movies}
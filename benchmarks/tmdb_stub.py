@@ -0,0 +1,91 @@
+"""Local stand-in for the TMDB API so benchmarks run offline
+
+Answers /movie/<tmdb_id> and /search/movie with deterministic payloads
+after an optional delay that mimics network latency. Every seventh id is a
+404 so negative caching is exercised too.
+
+    python -m benchmarks.tmdb_stub [--port 8765] [--latency-ms 30]
+"""
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    latency = 0.0
+
+    def do_GET(self):
+        self.server.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        path = urlparse(self.path).path
+        if path.startswith('/movie/'):
+            tmdb_id = int(path.rsplit('/', 1)[-1])
+            if tmdb_id % 7 == 0:
+                return self._send(404, {'status_code': 34})
+            return self._send(200, {
+                'id': tmdb_id,
+                'poster_path': f"/poster{tmdb_id}.jpg",
+                'overview': f"Synthetic overview for {tmdb_id}.",
+                'release_date': '2000-01-01',
+                'vote_average': round(5 + tmdb_id % 50 / 10, 1),
+            })
+        if path == '/search/movie':
+            return self._send(200, {'results': []})
+        return self._send(404, {})
+
+    def _send(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class StubServer:
+    def __init__(self, port=0, latency_ms=0):
+        handler = type('Handler', (StubHandler,), {'latency': latency_ms / 1000})
+        self.server = ThreadingHTTPServer(('127.0.0.1', port), handler)
+        self.server.daemon_threads = True
+        self.server.calls = 0
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    @property
+    def calls(self):
+        return self.server.calls
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency-ms', type=float, default=30)
+    args = parser.parse_args()
+    stub = StubServer(args.port, args.latency_ms).start()
+    print(f"TMDB stub listening on {stub.url}")
+    try:
+        stub.thread.join()
+    except KeyboardInterrupt:
+        stub.stop()
+
+
+if __name__ == '__main__':
+    main()
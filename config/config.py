@@ -6,12 +6,22 @@ load_dotenv()
 
 # TMDB API Configuration
 TMDB_API_KEY = os.getenv('TMDB_API_KEY')
-TMDB_BASE_URL = "https://api.themoviedb.org/3"
+TMDB_BASE_URL = os.getenv('TMDB_BASE_URL', "https://api.themoviedb.org/3")  # overridden by the benchmark stub
 TMDB_IMAGE_BASE_URL = "https://image.tmdb.org/t/p/w500"
+TMDB_MAX_WORKERS = 8  # concurrent lookups per page
+TMDB_RATE_LIMIT = 40  # requests per second across all workers
+TMDB_TIMEOUT = 5  # seconds per request
+# Set TMDB_OFFLINE=1 to serve only prefetched/cached metadata
+TMDB_OFFLINE = os.getenv('TMDB_OFFLINE', '').lower() in ('1', 'true', 'yes')
 
 # Data paths
 MOVIES_FILE = "data/movies.csv"
 RATINGS_FILE = "data/ratings.csv"
+TAGS_FILE = "data/tags.csv"
+LINKS_FILE = "data/links.csv"
+USER_HISTORY_FILE = "data/user_history.csv"
+TMDB_METADATA_FILE = "data/tmdb_metadata.jsonl"  # written by scripts/prefetch_metadata.py
+RATINGS_CACHE_DIR = "data/cache/ratings"  # binary copy of ratings.csv
 
 # Model parameters
 SVD_PARAMS = {
@@ -21,5 +31,99 @@ SVD_PARAMS = {
     'reg_all': 0.02
 }
 
+# Alternating least squares trainer (models/als.py)
+ALS_PARAMS = {
+    'n_factors': 100,
+    'n_iterations': 15,
+    'reg': 0.1,  # weighted by each user's / item's number of ratings
+    'workers': os.cpu_count() or 1,  # threads solving user and item blocks
+    'block_size': 1024,  # most users or items per batched solve
+}
+
+# 'svd' (surprise SGD) or 'als' (multi-threaded NumPy ALS)
+TRAINER = os.getenv('TRAINER', 'svd').lower()
+
+# Online fold-in of new interactions
+# per-rating regularisation, as in training
+FOLD_IN_REG = ALS_PARAMS['reg'] if TRAINER == 'als' else SVD_PARAMS['reg_all']
+FOLD_IN_WATCH_RATING = 4.0  # rating assumed for "Mark as Watched" without a rating
+
+# Background retraining
+RETRAIN_ENABLED = os.getenv('RETRAIN_ENABLED', '1').lower() in ('1', 'true', 'yes')
+RETRAIN_INTERVAL = 24 * 3600  # retrain at least this often, in seconds
+RETRAIN_EVENT_THRESHOLD = 50  # or once this many app interactions have accumulated
+RETRAIN_CHECK_INTERVAL = 60  # seconds between checks
+RETRAIN_HOLDOUT_SIZE = 5000  # MovieLens ratings left out of retraining to validate on
+RETRAIN_MAX_RMSE = 1.0  # reject retrained models above this RMSE on the held-out ratings
+RETRAIN_DIR = "data/model/retrained"
+RETRAIN_POINTER_FILE = "data/model/retrained/current.json"  # last swapped-in model, loaded at startup
+
+# Ranked-list cache for paging and repeat requests
+RANKING_CACHE_SIZE = 2048  # cached rankings per model
+RANKING_CACHE_TTL = 600  # seconds
+RANKING_CACHE_DEPTH = 100  # ranked items computed and cached per entry
+
+# Precomputed top-N table (scripts/precompute_recommendations.py)
+PRECOMPUTED_DIR = "data/model/topk"
+PRECOMPUTED_K = 100  # movies stored per user; deeper pages are scored live
+PRECOMPUTED_BLOCK_SIZE = 1024  # users scored per matrix product
+PRECOMPUTED_SCORE_DTYPE = 'float16'  # scores are only displayed to 2 decimals
+
+# JSON API (api.py)
+API_MAX_BATCH = 100  # user or movie ids per batch request
+API_MAX_RESULTS = 100  # largest n / offset / limit accepted
+
+# Metrics (/metrics) and slow-request profiling
+METRICS_PREFIX = "movierec_"
+# Set PROFILE_SLOW_REQUESTS=1 to sample stacks of requests slower than SLOW_REQUEST_SECONDS
+PROFILE_SLOW_REQUESTS = os.getenv('PROFILE_SLOW_REQUESTS', '').lower() in ('1', 'true', 'yes')
+SLOW_REQUEST_SECONDS = 1.0
+PROFILE_SAMPLE_INTERVAL = 0.005  # seconds between stack samples
+
+# Typeahead search for the movie and user dropdowns
+SEARCH_RESULT_LIMIT = 20
+
 # Cache configuration
-CACHE_EXPIRY = 3600  # 1 hour in seconds
\ No newline at end of file
+CACHE_EXPIRY = 3600  # 1 hour in seconds
+NEGATIVE_CACHE_EXPIRY = 86400  # movies TMDB has no match for, 1 day
+TMDB_CACHE_FILE = "data/tmdb_cache.sqlite3"
+METADATA_LRU_SIZE = 2048  # entries kept in memory in front of the store
+
+# Persisted model artifacts
+MODEL_DIR = "data/model"
+MODEL_FORMAT_VERSION = 2
+# Memory-map model arrays read-only so worker processes share one copy; None reads them into memory
+MODEL_MMAP_MODE = 'r'
+
+# Item similarity neighbour index
+SIMILARITY_TOP_K = 200  # neighbours kept per genre class or movie
+SIMILARITY_BLOCK_SIZE = 512  # rows scored per block while building the index
+SIMILARITY_WORKERS = os.cpu_count() or 1  # processes used to build the hybrid index
+SIMILARITY_TAG_WEIGHT = 0.5  # share of the hybrid score from user tags vs genres
+HYBRID_SIMILARITY_FILE = "data/model/hybrid_similarity.npz"
+
+# Collaborative similarity: IVF index over SVD item factors.
+# More probed lists means higher recall and higher latency.
+ANN_LISTS = None  # None: about sqrt(n_items) / 2 lists
+ANN_NPROBE = 10
+ANN_KMEANS_ITERATIONS = 10
+ANN_MIN_RATINGS = 10  # items with fewer training ratings have unreliable factors
+
+# Watch history journal
+HISTORY_FSYNC_EVERY = 16  # fsync the journal after this many appended events
+HISTORY_FSYNC_INTERVAL = 5.0  # or once this many seconds have passed
+HISTORY_COMPACT_EVERY = 1000  # rewrite the journal after this many appended rows
+HISTORY_FOLLOW_INTERVAL = 1.0  # seconds between checks for events other worker processes appended
+
+# Startup: bind right away and load models on a background thread
+BACKGROUND_WARMUP = os.getenv('BACKGROUND_WARMUP', '1').lower() in ('1', 'true', 'yes')
+WARMUP_RETRY_AFTER = 5  # seconds, sent as Retry-After while warming up
+
+# Offline evaluation (scripts/evaluate.py)
+EVAL_DIR = "data/eval"  # shared split files and results
+EVAL_FOLDS = 5  # folds of the random split
+EVAL_TEST_SIZE = 0.2  # share of the latest ratings held out by the time split
+EVAL_K = 10  # cutoff for precision, recall and NDCG
+EVAL_RELEVANT_RATING = 4.0  # held-out ratings at or above this count as relevant
+EVAL_MAX_USERS = 1000  # test users ranked per fold; None ranks all of them
+EVAL_WORKERS = os.cpu_count() or 1  # processes running folds and grid points
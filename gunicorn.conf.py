@@ -0,0 +1,39 @@
+"""Multi-worker serving: gunicorn -c gunicorn.conf.py app:server
+
+The app is imported once in the master with every model loaded
+(``preload_app``), then forked. Workers share those pages copy-on-write, and
+the factor arrays are memory-mapped, so adding workers adds throughput
+without another copy of the models. Threads do not survive a fork, which is
+why warm-up runs in the foreground in when_ready and the background
+retrainer, which would only ever swap the master's model, is off.
+"""
+import gc
+import multiprocessing
+import os
+
+os.environ['RETRAIN_ENABLED'] = '0'
+
+bind = os.getenv('BIND', '0.0.0.0:8050')
+workers = int(os.getenv('WEB_CONCURRENCY', multiprocessing.cpu_count()))
+threads = int(os.getenv('GUNICORN_THREADS', 4))
+preload_app = True
+timeout = 120
+
+
+def when_ready(server):
+    import app
+    # Runs in the master before any worker is forked
+    app.services.start(background=False)
+    # Keep the loaded objects out of the collector's generations, so
+    # collections in the workers do not touch (and copy) their pages
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    import app
+    from utils.metrics import registry
+    # Each worker keeps its own counters; the label tells their series apart
+    registry.set_labels(worker=str(os.getpid()))
+    # Events other workers append reach this worker's model too
+    if app.services.ready('history'):
+        app.services.user_history.follow()
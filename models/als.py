@@ -0,0 +1,128 @@
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import scipy.sparse as sp
+from config.config import ALS_PARAMS
+from models.factors import FactorModel
+
+
+def _solve_rows(matrix, fixed, fixed_bias, offset, reg, rows, length):
+    """Ridge solutions [factors, bias] for CSR rows with at most ``length`` ratings each
+
+    Row u solves (r_ui - offset_u - fixed_bias_i) ~ [fixed_i, 1] . w_u with
+    weighted-lambda regularisation (reg * number of ratings). The rows'
+    design matrices are gathered into one zero-padded (rows, length,
+    n_factors + 1) array, and all systems are built with one batched matmul
+    and solved with one batched call. Buckets shorter than n_factors + 1
+    solve the length x length dual system instead, X'(XX' + aI)^-1 y, which
+    is much cheaper for the long tail of rarely rated items; a padding entry
+    only has the penalty on its diagonal, so its dual weight is zero.
+    """
+    n_factors = fixed.shape[1]
+    size = n_factors + 1
+    starts = matrix.indptr[rows]
+    counts = matrix.indptr[rows + 1] - starts
+    mask = np.arange(length) < counts[:, None]
+    entries = np.where(mask, starts[:, None] + np.arange(length), 0)
+    cols = matrix.indices[entries]
+
+    x = np.empty((len(rows), length, size), dtype=np.float32)
+    x[..., :n_factors] = fixed[cols]
+    x[..., n_factors] = 1
+    x[~mask] = 0
+    target = np.where(mask, matrix.data[entries] - offset[rows][:, None] - fixed_bias[cols], 0).astype(np.float32)
+
+    xt = x.transpose(0, 2, 1)
+    penalty = (reg * counts)[:, None].astype(np.float32)
+    if length < size:
+        inner = x @ xt
+        inner[:, np.arange(length), np.arange(length)] += penalty
+        solution = (xt @ np.linalg.solve(inner, target[..., None]))[..., 0]
+    else:
+        grams = xt @ x
+        grams[:, np.arange(size), np.arange(size)] += penalty
+        solution = np.linalg.solve(grams, xt @ target[..., None])[..., 0]
+    return solution[:, :n_factors], solution[:, n_factors]
+
+
+def _sweep(executor, matrix, fixed, fixed_bias, offset, reg, block_size, max_elements=1 << 23):
+    """Solve every row of ``matrix`` against the fixed side
+
+    Rows are grouped by rating count into power-of-two length buckets, so
+    padding at most doubles the work, and each bucket is cut into chunks of
+    at most ``block_size`` rows and ``max_elements`` padded values. The
+    chunks run on the thread pool; matmul and solve release the GIL.
+    """
+    counts = np.diff(matrix.indptr)
+    factors = np.zeros((matrix.shape[0], fixed.shape[1]), dtype=np.float32)
+    biases = np.zeros(matrix.shape[0], dtype=np.float32)
+
+    rated = np.flatnonzero(counts)
+    lengths = 1 << np.ceil(np.log2(counts[rated])).astype(np.int64)
+    chunks = []
+    for length in np.unique(lengths):
+        rows = rated[lengths == length]
+        step = max(1, min(block_size, max_elements // (int(length) * (fixed.shape[1] + 1))))
+        chunks.extend((rows[start:start + step], int(length)) for start in range(0, len(rows), step))
+
+    results = executor.map(lambda chunk: _solve_rows(matrix, fixed, fixed_bias, offset, reg, *chunk), chunks)
+    for (rows, _), (row_factors, row_biases) in zip(chunks, results):
+        factors[rows] = row_factors
+        biases[rows] = row_biases
+    return factors, biases
+
+
+def train_als(ratings_df, version=None, n_factors=ALS_PARAMS['n_factors'],
+              n_iterations=ALS_PARAMS['n_iterations'], reg=ALS_PARAMS['reg'],
+              workers=ALS_PARAMS['workers'], block_size=ALS_PARAMS['block_size'], seed=0):
+    """Fit biased ALS on (userId, movieId, rating) rows and return a FactorModel
+
+    Works on float32 CSR matrices (users x items and its transpose) and
+    alternates closed-form user and item solves, batched over rows of similar
+    rating counts on a thread pool. The result has the same layout as the surprise
+    SVD export, so scoring, fold-in and artifacts work unchanged.
+    """
+    user_ids, user_codes = np.unique(ratings_df['userId'].to_numpy(dtype=np.int64), return_inverse=True)
+    item_ids, item_codes = np.unique(ratings_df['movieId'].to_numpy(dtype=np.int64), return_inverse=True)
+    ratings = ratings_df['rating'].to_numpy(dtype=np.float32)
+
+    # One rating per user and movie, the last one, as in build_training_ratings
+    pairs = user_codes.astype(np.int64) * len(item_ids) + item_codes
+    _, last = np.unique(pairs[::-1], return_index=True)
+    keep = np.sort(len(pairs) - 1 - last)
+    user_codes, item_codes, ratings = user_codes[keep], item_codes[keep], ratings[keep]
+    global_mean = float(ratings.mean())
+
+    by_user = sp.csr_matrix((ratings, (user_codes, item_codes)), shape=(len(user_ids), len(item_ids)))
+    by_user.sort_indices()
+    by_item = by_user.T.tocsr()
+    by_item.sort_indices()
+
+    rng = np.random.default_rng(seed)
+    pu = np.zeros((len(user_ids), n_factors), dtype=np.float32)
+    qi = rng.normal(0, 0.1, (len(item_ids), n_factors)).astype(np.float32)
+    bu = np.zeros(len(user_ids), dtype=np.float32)
+    bi = np.zeros(len(item_ids), dtype=np.float32)
+
+    user_offset = np.full(len(user_ids), global_mean, dtype=np.float32)
+    item_offset = np.full(len(item_ids), global_mean, dtype=np.float32)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for _ in range(n_iterations):
+            # Users against fixed items: r - mu - bi = [qi, 1] . [pu, bu]
+            pu, bu = _sweep(executor, by_user, qi, bi, user_offset, reg, block_size)
+            # Items against fixed users: r - mu - bu = [pu, 1] . [qi, bi]
+            qi, bi = _sweep(executor, by_item, pu, bu, item_offset, reg, block_size)
+
+    return FactorModel(
+        global_mean=global_mean,
+        pu=pu,
+        qi=qi,
+        bu=bu,
+        bi=bi,
+        user_ids=user_ids,
+        item_ids=item_ids,
+        rated_indptr=by_user.indptr.astype(np.int64),
+        rated_indices=by_user.indices.astype(np.int32),
+        rated_values=by_user.data.astype(np.float32),
+        rating_scale=(1, 5),
+        version=version,
+    )
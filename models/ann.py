@@ -0,0 +1,83 @@
+import numpy as np
+from config.config import ANN_LISTS, ANN_NPROBE, ANN_KMEANS_ITERATIONS
+
+
+def normalize_rows(vectors):
+    """L2-normalised float32 copy of ``vectors``; zero rows stay zero"""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return np.divide(vectors, norms, out=np.zeros_like(vectors), where=norms > 0)
+
+
+def spherical_kmeans(vectors, n_clusters, iterations=ANN_KMEANS_ITERATIONS, seed=0):
+    """Unit-length centroids and the cluster of every (unit-length) vector"""
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), n_clusters, replace=False)].copy()
+    for _ in range(iterations):
+        assignments = np.argmax(vectors @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignments, vectors)
+        empty = ~sums.any(axis=1)
+        # Re-seed empty clusters instead of letting them collapse
+        sums[empty] = vectors[rng.choice(len(vectors), int(empty.sum()), replace=False)]
+        centroids = normalize_rows(sums)
+    return centroids, np.argmax(vectors @ centroids.T, axis=1)
+
+
+class IVFIndex:
+    """Inverted-file index for cosine nearest neighbours
+
+    Vectors are clustered with spherical k-means and stored contiguously per
+    cluster. A query is compared to the centroids, then only against the
+    members of the ``nprobe`` closest clusters, so raising nprobe trades
+    latency for recall. No item x item matrix is ever built.
+    """
+
+    def __init__(self, vectors, ids, n_lists=ANN_LISTS, nprobe=ANN_NPROBE, seed=0):
+        vectors = normalize_rows(vectors)
+        ids = np.asarray(ids)
+        if n_lists is None:
+            n_lists = int(np.sqrt(len(vectors)) / 2)
+        n_lists = max(1, min(n_lists, len(vectors)))
+        self.nprobe = nprobe
+        self.centroids, assignments = spherical_kmeans(vectors, n_lists, seed=seed)
+
+        order = np.argsort(assignments, kind='stable')
+        self.list_ids = ids[order]
+        self.list_vectors = np.ascontiguousarray(vectors[order])
+        self.list_indptr = np.zeros(n_lists + 1, dtype=np.int64)
+        np.cumsum(np.bincount(assignments, minlength=n_lists), out=self.list_indptr[1:])
+
+    def __len__(self):
+        return len(self.list_ids)
+
+    def search(self, query, k, nprobe=None, exclude=None):
+        """Ids and cosine scores of the approximate top-k, best first
+
+        Probes at least ``nprobe`` lists and keeps probing closer lists until
+        k candidates are available. Returns a third value that is True when
+        every list was probed, i.e. the result is exact and exhaustive.
+        """
+        query = normalize_rows(np.asarray(query)[None, :])[0]
+        nprobe = nprobe or self.nprobe
+        list_order = np.argsort(-(self.centroids @ query))
+        sizes = np.diff(self.list_indptr)[list_order]
+        # One extra candidate in case the excluded id is among them
+        needed = k + (exclude is not None)
+        n_probed = max(min(nprobe, len(list_order)), int(np.searchsorted(np.cumsum(sizes), needed)) + 1)
+        n_probed = min(n_probed, len(list_order))
+
+        probed = list_order[:n_probed]
+        slices = [np.arange(self.list_indptr[i], self.list_indptr[i + 1]) for i in probed]
+        rows = np.concatenate(slices) if slices else np.empty(0, dtype=np.int64)
+        scores = self.list_vectors[rows] @ query
+        if exclude is not None:
+            keep = self.list_ids[rows] != exclude
+            rows, scores = rows[keep], scores[keep]
+
+        if k < len(rows):
+            top = np.argpartition(-scores, k - 1)[:k]
+        else:
+            top = np.arange(len(rows))
+        top = top[np.lexsort((self.list_ids[rows[top]], -scores[top]))]
+        return self.list_ids[rows[top]], scores[top], n_probed == len(list_order)
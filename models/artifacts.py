@@ -0,0 +1,108 @@
+import hashlib
+import json
+import os
+import time
+import numpy as np
+from config.config import MODEL_FORMAT_VERSION
+from models.factors import FactorModel
+
+MANIFEST_FILE = "manifest.json"
+ARRAY_NAMES = ['pu', 'qi', 'bu', 'bi', 'user_ids', 'item_ids', 'rated_indptr', 'rated_indices', 'rated_values']
+
+
+def artifact_key(ratings_file, params):
+    """Hash of the ratings file's size and mtime, model parameters and format version
+
+    Like the ratings cache, the file is identified by its stat signature
+    rather than its contents, so computing the key reads nothing even for
+    ml-25m sized dumps; rewriting the file changes the key.
+    """
+    stat = os.stat(ratings_file)
+    digest = hashlib.sha256(f"{stat.st_size}:{stat.st_mtime_ns}".encode())
+    digest.update(json.dumps(params, sort_keys=True).encode())
+    digest.update(str(MODEL_FORMAT_VERSION).encode())
+    return digest.hexdigest()
+
+
+def save_artifact(factors, directory, key):
+    """Write factor arrays as .npy files followed by the manifest
+
+    The manifest is written last and replaced atomically, so a crash part way
+    through leaves either the previous artifact or a stale one, never a
+    manifest pointing at half-written arrays. Arrays are replaced rather than
+    overwritten, so processes that memory-mapped the old files keep a valid
+    mapping.
+    """
+    os.makedirs(directory, exist_ok=True)
+    for name in ARRAY_NAMES:
+        path = os.path.join(directory, f"{name}.npy")
+        with open(path + '.tmp', 'wb') as f:
+            np.save(f, getattr(factors, name))
+        os.replace(path + '.tmp', path)
+
+    manifest = {
+        'key': key,
+        'format_version': MODEL_FORMAT_VERSION,
+        'global_mean': factors.global_mean,
+        'rating_scale': list(factors.rating_scale),
+        'n_users': int(len(factors.user_ids)),
+        'n_items': int(len(factors.item_ids)),
+        'n_factors': int(factors.qi.shape[1]),
+        'created_at': time.time(),
+    }
+    tmp_path = os.path.join(directory, MANIFEST_FILE + '.tmp')
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, os.path.join(directory, MANIFEST_FILE))
+
+
+def save_pointer(path, directory, key, base_key):
+    """Record the artifact the server should load on its next start
+
+    ``base_key`` is the key of the model trained on the ratings file alone;
+    the pointer is ignored once that changes, i.e. when ratings.csv or the
+    trainer parameters do. Replaced atomically like the manifest.
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path + '.tmp', 'w') as f:
+        json.dump({'directory': directory, 'key': key, 'base_key': base_key}, f, indent=2)
+    os.replace(path + '.tmp', path)
+
+
+def load_pointer(path):
+    """The pointer saved by save_pointer, or None"""
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+def load_artifact(directory, key, mmap_mode=None):
+    """Load a saved FactorModel, or return None when missing or stale
+
+    With ``mmap_mode='r'`` the arrays are read-only memory maps, so every
+    process serving the same artifact shares one copy in the page cache.
+    """
+    try:
+        with open(os.path.join(directory, MANIFEST_FILE)) as f:
+            manifest = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+    if manifest.get('key') != key or manifest.get('format_version') != MODEL_FORMAT_VERSION:
+        return None
+
+    try:
+        arrays = {name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode=mmap_mode)
+                  for name in ARRAY_NAMES}
+    except (FileNotFoundError, ValueError) as e:
+        print(f"Error loading model artifact from {directory}: {e}")
+        return None
+
+    return FactorModel(
+        global_mean=manifest['global_mean'],
+        rating_scale=tuple(manifest['rating_scale']),
+        version=key[:12],
+        **arrays
+    )
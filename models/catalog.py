@@ -0,0 +1,55 @@
+import numpy as np
+import pandas as pd
+from config.config import MOVIES_FILE
+
+
+class MovieCatalog:
+    """Movies loaded once and shared by the models and the Dash callbacks
+
+    Titles and genres are stored as columns aligned with ``movie_ids``; a dense
+    movieId -> row position array makes every lookup constant time.
+    """
+
+    def __init__(self):
+        self.movie_ids = None
+        self.titles = None
+        self.genres = None
+        self._positions = None
+
+    def load_data(self, path=MOVIES_FILE):
+        movies_df = pd.read_csv(path, dtype={'movieId': np.int32})
+        self.movie_ids = movies_df['movieId'].to_numpy()
+        self.titles = movies_df['title'].to_numpy(dtype=object)
+        self.genres = movies_df['genres'].to_numpy(dtype=object)
+
+        self._positions = np.full(int(self.movie_ids.max()) + 1, -1, dtype=np.int32)
+        self._positions[self.movie_ids] = np.arange(len(self.movie_ids), dtype=np.int32)
+
+    def __len__(self):
+        return len(self.movie_ids)
+
+    def positions(self, movie_ids):
+        """Row positions for an array of movieIds, -1 for unknown ids"""
+        movie_ids = np.asarray(movie_ids, dtype=np.int64)
+        known = (movie_ids >= 0) & (movie_ids < len(self._positions))
+        positions = np.full(len(movie_ids), -1, dtype=np.int32)
+        positions[known] = self._positions[movie_ids[known]]
+        return positions
+
+    def position(self, movie_id):
+        """Row position of a movieId, or -1 when it is not in the catalog"""
+        movie_id = int(movie_id)
+        if 0 <= movie_id < len(self._positions):
+            return int(self._positions[movie_id])
+        return -1
+
+    def count_by_movie(self, movie_ids):
+        """How often each catalog movie occurs in ``movie_ids`` (e.g. rating counts)"""
+        return np.bincount(self.positions(movie_ids) + 1, minlength=len(self) + 1)[1:]
+
+    def records(self, positions):
+        """Catalog rows at the given positions as a list of dicts"""
+        return [
+            {'movieId': int(self.movie_ids[pos]), 'title': self.titles[pos], 'genres': self.genres[pos]}
+            for pos in positions
+        ]
@@ -0,0 +1,109 @@
+import numpy as np
+
+
+class FactorModel:
+    """Plain NumPy view of a fitted biased matrix factorization model"""
+
+    def __init__(self, global_mean, pu, qi, bu, bi, user_ids, item_ids,
+                 rated_indptr, rated_indices, rated_values, rating_scale=(1, 5), version=None):
+        self.global_mean = float(global_mean)
+        self.pu = pu
+        self.qi = qi
+        self.bu = bu
+        self.bi = bi
+        self.user_ids = user_ids
+        self.item_ids = item_ids
+        # CSR-style list of inner item ids (and ratings) for each inner user
+        self.rated_indptr = rated_indptr
+        self.rated_indices = rated_indices
+        self.rated_values = rated_values
+        self.rating_scale = rating_scale
+        # Identifies the training run, e.g. the artifact key
+        self.version = version
+        self.user_index = {int(raw): inner for inner, raw in enumerate(user_ids)}
+
+    @classmethod
+    def from_surprise(cls, algo, trainset, version=None):
+        """Extract factors, biases and id maps from a fitted surprise SVD"""
+        n_users = trainset.n_users
+        user_ids = np.array([trainset.to_raw_uid(u) for u in range(n_users)], dtype=np.int64)
+        item_ids = np.array([trainset.to_raw_iid(i) for i in range(trainset.n_items)], dtype=np.int64)
+
+        rated_indptr = np.zeros(n_users + 1, dtype=np.int64)
+        for u in range(n_users):
+            rated_indptr[u + 1] = rated_indptr[u] + len(trainset.ur[u])
+        rated_indices = np.fromiter(
+            (i for u in range(n_users) for i, _ in trainset.ur[u]),
+            dtype=np.int32, count=rated_indptr[-1]
+        )
+        rated_values = np.fromiter(
+            (r for u in range(n_users) for _, r in trainset.ur[u]),
+            dtype=np.float32, count=rated_indptr[-1]
+        )
+
+        return cls(
+            global_mean=trainset.global_mean,
+            pu=np.asarray(algo.pu),
+            qi=np.asarray(algo.qi),
+            bu=np.asarray(algo.bu),
+            bi=np.asarray(algo.bi),
+            user_ids=user_ids,
+            item_ids=item_ids,
+            rated_indptr=rated_indptr,
+            rated_indices=rated_indices,
+            rated_values=rated_values,
+            rating_scale=trainset.rating_scale,
+            version=version,
+        )
+
+    def rated_items(self, inner_uid):
+        """Inner item ids the given inner user rated in the trainset"""
+        return self.rated_indices[self.rated_indptr[inner_uid]:self.rated_indptr[inner_uid + 1]]
+
+    def rated_ratings(self, inner_uid):
+        """Ratings matching ``rated_items(inner_uid)``"""
+        return self.rated_values[self.rated_indptr[inner_uid]:self.rated_indptr[inner_uid + 1]]
+
+    def item_inner_ids(self, movie_ids):
+        """Inner item ids for an array of raw movieIds, -1 for unknown items"""
+        movie_ids = np.asarray(movie_ids, dtype=np.int64)
+        order = np.argsort(self.item_ids, kind='stable')
+        sorted_ids = self.item_ids[order]
+        found = np.minimum(np.searchsorted(sorted_ids, movie_ids), len(sorted_ids) - 1)
+        return np.where(sorted_ids[found] == movie_ids, order[found], -1)
+
+    def predict(self, user_ids, movie_ids):
+        """Clipped rating estimates for paired raw user and movie ids
+
+        Unknown users or items contribute no bias or factors, as in surprise.
+        """
+        users = np.array([self.user_index.get(int(u), -1) for u in user_ids], dtype=np.int64)
+        items = self.item_inner_ids(movie_ids)
+        known_user, known_item = users >= 0, items >= 0
+        users, items = np.maximum(users, 0), np.maximum(items, 0)
+
+        estimates = (self.global_mean + np.where(known_user, self.bu[users], 0)
+                     + np.where(known_item, self.bi[items], 0))
+        both = known_user & known_item
+        estimates[both] += np.einsum('ij,ij->i', self.pu[users[both]], self.qi[items[both]])
+        return np.clip(estimates, *self.rating_scale)
+
+    def align_items(self, movie_ids):
+        """Gather item factors and biases in the order of ``movie_ids``
+
+        Movies unknown to the model get zero factors and bias, which matches
+        how surprise estimates ratings for unknown items. Returns the aligned
+        factors, biases and the catalog position of every inner item (-1 when
+        the item is not in ``movie_ids``).
+        """
+        inner = self.item_inner_ids(movie_ids)
+        known = inner >= 0
+
+        qi = np.zeros((len(movie_ids), self.qi.shape[1]), dtype=self.qi.dtype)
+        bi = np.zeros(len(movie_ids), dtype=self.bi.dtype)
+        qi[known] = self.qi[inner[known]]
+        bi[known] = self.bi[inner[known]]
+
+        item_positions = np.full(len(self.item_ids), -1, dtype=np.int64)
+        item_positions[inner[known]] = np.flatnonzero(known)
+        return qi, bi, item_positions
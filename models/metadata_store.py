@@ -0,0 +1,102 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from config.config import CACHE_EXPIRY, NEGATIVE_CACHE_EXPIRY, TMDB_CACHE_FILE, METADATA_LRU_SIZE
+
+
+class MetadataStore:
+    """SQLite-backed TMDB metadata cache keyed by MovieLens movieId
+
+    Entries expire after ``ttl`` seconds, or ``negative_ttl`` for movies TMDB
+    had no match for. A bounded in-memory LRU sits in front of the database.
+    """
+
+    def __init__(self, path=TMDB_CACHE_FILE, ttl=CACHE_EXPIRY,
+                 negative_ttl=NEGATIVE_CACHE_EXPIRY, lru_size=METADATA_LRU_SIZE):
+        self.path = path
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.lru_size = lru_size
+        self.lru = OrderedDict()  # movie_id -> (info, expires_at)
+        self.lock = threading.Lock()
+        self.pid = None
+        self._connect()
+
+    def _connect(self):
+        # SQLite connections must not cross a fork, so every process (e.g.
+        # each gunicorn worker) opens its own; WAL lets them share the file
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS movie_metadata ("
+            "movie_id INTEGER PRIMARY KEY, tmdb_id INTEGER, found INTEGER NOT NULL, "
+            "info TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+        self.conn.commit()
+        self.pid = os.getpid()
+
+    def _connection(self):
+        if self.pid != os.getpid():
+            self._connect()
+        return self.conn
+
+    def _remember(self, movie_id, info, expires_at):
+        self.lru[movie_id] = (info, expires_at)
+        self.lru.move_to_end(movie_id)
+        while len(self.lru) > self.lru_size:
+            self.lru.popitem(last=False)
+
+    def get(self, movie_id):
+        """Cached info for a movie, or None when missing or expired"""
+        return self.get_many([movie_id]).get(movie_id)
+
+    def get_many(self, movie_ids):
+        """Return {movie_id: info} for every id with a live cache entry"""
+        now = time.time()
+        found = {}
+        missing = []
+        with self.lock:
+            for movie_id in movie_ids:
+                entry = self.lru.get(movie_id)
+                if entry is not None and entry[1] > now:
+                    self.lru.move_to_end(movie_id)
+                    found[movie_id] = entry[0]
+                else:
+                    missing.append(movie_id)
+
+            # SQLite caps the number of bound parameters per statement
+            for start in range(0, len(missing), 500):
+                chunk = missing[start:start + 500]
+                rows = self._connection().execute(
+                    f"SELECT movie_id, info, expires_at FROM movie_metadata "
+                    f"WHERE movie_id IN ({','.join('?' * len(chunk))}) AND expires_at > ?",
+                    (*chunk, now)
+                ).fetchall()
+                for movie_id, info, expires_at in rows:
+                    info = json.loads(info)
+                    self._remember(movie_id, info, expires_at)
+                    found[movie_id] = info
+        return found
+
+    def put(self, movie_id, info, found=True, tmdb_id=None):
+        self.put_many([(movie_id, info, found, tmdb_id)])
+
+    def put_many(self, entries):
+        """Store (movie_id, info, found, tmdb_id) tuples in one transaction"""
+        now = time.time()
+        rows = []
+        with self.lock:
+            for movie_id, info, found, tmdb_id in entries:
+                expires_at = now + (self.ttl if found else self.negative_ttl)
+                self._remember(movie_id, info, expires_at)
+                rows.append((movie_id, tmdb_id, int(found), json.dumps(info), expires_at))
+            conn = self._connection()
+            conn.executemany(
+                "INSERT OR REPLACE INTO movie_metadata (movie_id, tmdb_id, found, info, expires_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                rows
+            )
+            conn.commit()
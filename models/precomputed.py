@@ -0,0 +1,150 @@
+import json
+import os
+import time
+import numpy as np
+from config.config import PRECOMPUTED_DIR, PRECOMPUTED_K, PRECOMPUTED_BLOCK_SIZE, PRECOMPUTED_SCORE_DTYPE
+
+MANIFEST_FILE = "manifest.json"
+
+
+def top_k(scores, k):
+    """Indices of the k best finite scores, best first
+
+    Ties are broken by index (catalog) order, including ties at the k-th
+    score, so live scoring and the precomputed table rank alike.
+    """
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    threshold = -np.partition(-scores, k - 1)[k - 1]
+    candidates = np.flatnonzero(scores >= threshold)
+    candidates = candidates[np.isfinite(scores[candidates])]
+    return candidates[np.argsort(-scores[candidates], kind='stable')][:k]
+
+
+def rank_rows(scores, k):
+    """Top-k column indices and scores of every row, best first
+
+    Rows are ranked with top_k. Rows with fewer than k finite scores are
+    padded with index -1.
+    """
+    indices = np.full((len(scores), k), -1, dtype=np.int64)
+    top_scores = np.full((len(scores), k), np.nan, dtype=np.float32)
+    for row in range(len(scores)):
+        candidates = top_k(scores[row], k)
+        indices[row, :len(candidates)] = candidates
+        top_scores[row, :len(candidates)] = scores[row, candidates]
+    return indices, top_scores
+
+
+def precompute_top_k(serving, catalog, directory=PRECOMPUTED_DIR, k=PRECOMPUTED_K,
+                     block_size=PRECOMPUTED_BLOCK_SIZE, score_dtype=PRECOMPUTED_SCORE_DTYPE):
+    """Score every user against every catalog movie and write the top-k table
+
+    Users are scored ``block_size`` at a time with one matrix product, rated
+    movies are excluded, and each block is written straight into
+    memory-mapped .npy files, so peak memory is one block of scores. The
+    manifest is replaced last and names the array files, so readers only
+    ever see a complete table; files of the previous table are removed
+    afterwards (open memory maps keep working).
+    """
+    factors = serving.factors
+    n_users = len(factors.user_ids)
+    k = min(k, len(catalog))
+    os.makedirs(directory, exist_ok=True)
+    stamp = time.strftime('%Y%m%d-%H%M%S')
+    files = {name: f"{name}-{stamp}.npy" for name in ('users', 'movie_ids', 'scores')}
+
+    order = np.argsort(factors.user_ids, kind='stable')
+    np.save(os.path.join(directory, files['users']), factors.user_ids[order])
+    movie_ids = np.lib.format.open_memmap(os.path.join(directory, files['movie_ids']), mode='w+',
+                                          dtype=np.int32, shape=(n_users, k))
+    scores = np.lib.format.open_memmap(os.path.join(directory, files['scores']), mode='w+',
+                                       dtype=score_dtype, shape=(n_users, k))
+
+    for start in range(0, n_users, block_size):
+        users = order[start:start + block_size]
+        block = (factors.global_mean + factors.bu[users, None] + serving.catalog_bi[None, :]
+                 + factors.pu[users] @ serving.catalog_qi.T)
+        np.clip(block, *factors.rating_scale, out=block)
+        for row, inner_uid in enumerate(users):
+            rated = serving.item_positions[factors.rated_items(inner_uid)]
+            block[row, rated[rated >= 0]] = -np.inf
+
+        positions, top_scores = rank_rows(block, k)
+        movie_ids[start:start + len(users)] = np.where(positions >= 0, catalog.movie_ids[positions], -1)
+        scores[start:start + len(users)] = top_scores
+    movie_ids.flush()
+    scores.flush()
+    del movie_ids, scores
+
+    manifest = {
+        'model_version': factors.version,
+        'k': k,
+        'n_users': n_users,
+        'files': files,
+        'created_at': time.time(),
+    }
+    previous = _read_manifest(directory)
+    tmp_path = os.path.join(directory, MANIFEST_FILE + '.tmp')
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, os.path.join(directory, MANIFEST_FILE))
+
+    if previous is not None:
+        for name in previous.get('files', {}).values():
+            if name not in files.values():
+                try:
+                    os.remove(os.path.join(directory, name))
+                except FileNotFoundError:
+                    pass
+    return manifest
+
+
+def _read_manifest(directory):
+    try:
+        with open(os.path.join(directory, MANIFEST_FILE)) as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+class PrecomputedTopK:
+    """Read-only, memory-mapped view of a precomputed top-k table
+
+    A lookup is a binary search over user ids plus one row slice, so serving
+    a page reads O(k) bytes from the page cache.
+    """
+
+    def __init__(self, model_version, users, movie_ids, scores):
+        self.model_version = model_version
+        self.users = users
+        self.movie_ids = movie_ids
+        self.scores = scores
+        self.k = movie_ids.shape[1]
+
+    @classmethod
+    def load(cls, directory=PRECOMPUTED_DIR):
+        """The table in ``directory``, or None when there is none"""
+        manifest = _read_manifest(directory)
+        if manifest is None:
+            return None
+        try:
+            arrays = {name: np.load(os.path.join(directory, path), mmap_mode='r')
+                      for name, path in manifest['files'].items()}
+        except (FileNotFoundError, KeyError, ValueError) as e:
+            print(f"Error loading precomputed recommendations from {directory}: {e}")
+            return None
+        return cls(manifest['model_version'], **arrays)
+
+    def get(self, user_id, k):
+        """(movie_ids, scores) of the user's first k movies, or None if not covered"""
+        if k > self.k:
+            return None
+        row = np.searchsorted(self.users, user_id)
+        if row >= len(self.users) or self.users[row] != user_id:
+            return None
+        movie_ids = np.asarray(self.movie_ids[row, :k])
+        scores = np.asarray(self.scores[row, :k], dtype=np.float64)
+        filled = movie_ids >= 0
+        return movie_ids[filled], scores[filled]
@@ -0,0 +1,72 @@
+import threading
+import time
+from collections import OrderedDict
+from config.config import RANKING_CACHE_SIZE, RANKING_CACHE_TTL
+
+
+class RankedList:
+    def __init__(self, version, ids, scores, complete, expires_at):
+        self.version = version
+        self.ids = ids
+        self.scores = scores
+        # True when ids holds every candidate, so shorter pages are final
+        self.complete = complete
+        self.expires_at = expires_at
+
+    def covers(self, k):
+        return self.complete or len(self.ids) >= k
+
+
+class RankedListCache:
+    """Bounded LRU + TTL cache of ranked id/score arrays
+
+    Entries carry the version they were computed against (model generation,
+    user revision, ...). A lookup with a different version is a miss, so a
+    model swap or a new interaction invalidates exactly the affected entries.
+    """
+
+    def __init__(self, max_entries=RANKING_CACHE_SIZE, ttl=RANKING_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, version, k):
+        """The cached ranking for ``key`` if it is current and has k items"""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry.version == version and entry.expires_at > time.monotonic():
+                if entry.covers(k):
+                    self.entries.move_to_end(key)
+                    self.hits += 1
+                    return entry
+            elif entry is not None:
+                del self.entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, version, ids, scores, complete):
+        entry = RankedList(version, ids, scores, complete, time.monotonic() + self.ttl)
+        with self.lock:
+            self.entries[key] = entry
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+        return entry
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self):
+        with self.lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'size': len(self.entries),
+            }
@@ -0,0 +1,73 @@
+import json
+import os
+import numpy as np
+import pandas as pd
+from config.config import RATINGS_FILE, RATINGS_CACHE_DIR
+
+RATING_DTYPES = {
+    'userId': np.int32,
+    'movieId': np.int32,
+    'rating': np.float32,
+    'timestamp': np.int64,  # seconds since the epoch
+}
+SOURCES = ['movielens', 'app']
+META_FILE = "meta.json"
+
+
+def _source_signature(path):
+    stat = os.stat(path)
+    return {'path': os.path.abspath(path), 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+def _load_cache(cache_dir, signature, mmap_mode):
+    try:
+        with open(os.path.join(cache_dir, META_FILE)) as f:
+            if json.load(f) != signature:
+                return None
+        return {
+            column: np.load(os.path.join(cache_dir, f"{column}.npy"), mmap_mode=mmap_mode)
+            for column in RATING_DTYPES
+        }
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def _write_cache(cache_dir, signature, columns):
+    os.makedirs(cache_dir, exist_ok=True)
+    for column, values in columns.items():
+        np.save(os.path.join(cache_dir, f"{column}.npy"), values)
+    # Written last so a partial cache is never picked up
+    tmp_path = os.path.join(cache_dir, META_FILE + '.tmp')
+    with open(tmp_path, 'w') as f:
+        json.dump(signature, f)
+    os.replace(tmp_path, os.path.join(cache_dir, META_FILE))
+
+
+def load_rating_columns(path=RATINGS_FILE, cache_dir=RATINGS_CACHE_DIR, mmap_mode=None):
+    """MovieLens ratings as a dict of compact NumPy columns
+
+    The CSV is parsed once and saved as .npy files; later calls load those
+    directly (optionally memory-mapped) until ratings.csv changes.
+    """
+    signature = _source_signature(path)
+    columns = _load_cache(cache_dir, signature, mmap_mode)
+    if columns is not None:
+        return columns
+
+    ratings_df = pd.read_csv(path, usecols=list(RATING_DTYPES), dtype=RATING_DTYPES)
+    columns = {column: ratings_df[column].to_numpy() for column in RATING_DTYPES}
+    try:
+        _write_cache(cache_dir, signature, columns)
+    except OSError as e:
+        print(f"Could not write ratings cache to {cache_dir}: {e}")
+    return columns
+
+
+def load_ratings(path=RATINGS_FILE, cache_dir=RATINGS_CACHE_DIR):
+    """MovieLens ratings as a compact DataFrame with a categorical source column"""
+    columns = load_rating_columns(path, cache_dir)
+    ratings_df = pd.DataFrame(columns, copy=False)
+    ratings_df['source'] = pd.Categorical.from_codes(
+        np.zeros(len(ratings_df), dtype=np.int8), categories=SOURCES
+    )
+    return ratings_df
@@ -1,41 +1,311 @@
-from surprise import Dataset, Reader, SVD
-import pandas as pd
-from config.config import SVD_PARAMS, MOVIES_FILE, RATINGS_FILE
+import itertools
+import threading
+import time
+import numpy as np
+from config.config import (SVD_PARAMS, ALS_PARAMS, TRAINER, RATINGS_FILE, MODEL_DIR, FOLD_IN_REG,
+                           FOLD_IN_WATCH_RATING, RANKING_CACHE_DEPTH, MODEL_MMAP_MODE, RETRAIN_POINTER_FILE)
+from models.als import train_als
+from models.artifacts import artifact_key, load_artifact, load_pointer, save_artifact
+from models.factors import FactorModel
+from models.precomputed import PrecomputedTopK, top_k
+from models.ranking_cache import RankedListCache
+from models.ratings import load_ratings
+from utils.metrics import observe, timer
+
+# Distinguishes serving models and fold-in results for cache versioning
+_revisions = itertools.count(1)
+
+def train_svd(ratings_df, version=None, params=None):
+    """Fit a surprise SVD on (userId, movieId, rating) rows and return its FactorModel
+
+    ``params`` override SVD_PARAMS, e.g. for a parameter sweep.
+    """
+    # Imported here so serving a persisted model never loads surprise
+    from surprise import Dataset, Reader, SVD
+    reader = Reader(rating_scale=(1, 5))
+    data = Dataset.load_from_df(ratings_df[['userId', 'movieId', 'rating']], reader)
+
+    trainset = data.build_full_trainset()
+    model = SVD(**{**SVD_PARAMS, **(params or {})})
+    model.fit(trainset)
+    return FactorModel.from_surprise(model, trainset, version=version)
+
+
+def train_model(ratings_df, version=None):
+    """Fit the configured TRAINER ('svd' or 'als') and return its FactorModel"""
+    if TRAINER == 'als':
+        return train_als(ratings_df, version=version)
+    return train_svd(ratings_df, version=version)
+
+
+def trainer_params():
+    """Parameters identifying the configured trainer, used in artifact keys"""
+    if TRAINER == 'als':
+        # Threading and block size do not change the result
+        return {'trainer': 'als', **{name: value for name, value in ALS_PARAMS.items()
+                                     if name not in ('workers', 'block_size')}}
+    return SVD_PARAMS
+
+
+class ServingModel:
+    """A FactorModel aligned with the catalog, plus users folded in online"""
+
+    def __init__(self, factors, catalog):
+        self.factors = factors
+        self.generation = next(_revisions)
+        # Item factors/biases aligned with catalog rows
+        self.catalog_qi, self.catalog_bi, self.item_positions = factors.align_items(catalog.movie_ids)
+        self.user_overrides = {}
+
 
 class MovieRecommender:
-    def __init__(self, tmdb_api):
-        self.model = SVD(**SVD_PARAMS)
-        self.movies_df = None
+    def __init__(self, tmdb_api, catalog):
+        self.catalog = catalog
         self.ratings_df = None
         self.tmdb_api = tmdb_api
-        
+        # Swapped as a single reference, so a request that already picked up
+        # the previous model keeps using it until it finishes
+        self.serving = None
+        self.lock = threading.Lock()
+        self.ranking_cache = RankedListCache()
+        # Offline top-N table; used only while it matches the serving model
+        self.precomputed = None
+        # Where the model loaded at startup came from
+        self.artifact_directory = None
+
+    @property
+    def factors(self):
+        return self.serving.factors
+
+    @property
+    def model_version(self):
+        return self.serving.factors.version
+
     def load_data(self):
-        self.movies_df = pd.read_csv(MOVIES_FILE)
-        self.ratings_df = pd.read_csv(RATINGS_FILE)
-        
-        reader = Reader(rating_scale=(1, 5))
-        data = Dataset.load_from_df(self.ratings_df[['userId', 'movieId', 'rating']], reader)
-        
-        trainset = data.build_full_trainset()
-        self.model.fit(trainset)
-        
+        # Reuse the persisted model unless the ratings or trainer parameters changed
+        started = time.perf_counter()
+        key = artifact_key(RATINGS_FILE, trainer_params())
+        factors = None
+        # A retrained model that was swapped in outlives restarts, until the
+        # ratings it was trained on change
+        pointer = load_pointer(RETRAIN_POINTER_FILE)
+        if pointer is not None and pointer.get('base_key') == key:
+            factors = load_artifact(pointer['directory'], pointer['key'], MODEL_MMAP_MODE)
+            source, self.artifact_directory = 'retrained', pointer['directory']
+        if factors is None:
+            factors = load_artifact(MODEL_DIR, key, MODEL_MMAP_MODE)
+            source, self.artifact_directory = 'artifact', MODEL_DIR
+        if factors is None:
+            source = 'train'
+            with timer('model_train_seconds', trainer=TRAINER):
+                factors = self.train(version=key[:12])
+            save_artifact(factors, MODEL_DIR, key)
+            # Serve from the saved files, like every later start
+            factors = load_artifact(MODEL_DIR, key, MODEL_MMAP_MODE) or factors
+        observe('model_load_seconds', time.perf_counter() - started, source=source)
+        self.set_factors(factors)
+
+        self.precomputed = PrecomputedTopK.load()
+        if self.precomputed is not None and self.precomputed.model_version != factors.version:
+            print("Precomputed recommendations are for another model; scoring live")
+
+    def train(self, version=None):
+        """Fit the configured trainer on the full ratings file and return its FactorModel"""
+        self.ratings_df = load_ratings()
+        return train_model(self.ratings_df, version=version)
+
+    def set_factors(self, factors):
+        """Atomically replace the serving model
+
+        Users folded in against the previous model are re-solved against the
+        new item factors before the swap, so their updates are not lost.
+        """
+        serving = ServingModel(factors, self.catalog)
+        with self.lock:
+            if self.serving is not None:
+                for user_id, override in self.serving.user_overrides.items():
+                    self._fold_in(serving, user_id, override['interactions'])
+            self.serving = serving
+        # Entries for the old model can never match again
+        self.ranking_cache.clear()
+
+    def score_items(self, user_id, serving=None):
+        """Predicted rating for every catalog movie, in catalog order
+
+        Movies the user already rated are set to -inf so they never rank.
+        """
+        serving = serving or self.serving
+        factors = serving.factors
+        override = serving.user_overrides.get(int(user_id))
+        if override is not None:
+            scores = factors.global_mean + override['bu'] + serving.catalog_bi + serving.catalog_qi @ override['pu']
+            np.clip(scores, *factors.rating_scale, out=scores)
+            scores[override['rated_positions']] = -np.inf
+            return scores
+
+        inner_uid = factors.user_index.get(int(user_id))
+
+        scores = factors.global_mean + serving.catalog_bi
+        if inner_uid is not None:
+            scores = scores + factors.bu[inner_uid] + serving.catalog_qi @ factors.pu[inner_uid]
+        np.clip(scores, *factors.rating_scale, out=scores)
+
+        if inner_uid is not None:
+            rated = serving.item_positions[factors.rated_items(inner_uid)]
+            scores[rated[rated >= 0]] = -np.inf
+        return scores
+
+    def _interactions(self, serving, user_id):
+        """{movieId: rating} the user's current factors were solved from"""
+        override = serving.user_overrides.get(user_id)
+        if override is not None:
+            return dict(override['interactions'])
+        return self._trained_interactions(serving.factors, user_id)
+
+    @staticmethod
+    def _trained_interactions(factors, user_id):
+        """{movieId: rating} the model was trained on for this user"""
+        inner_uid = factors.user_index.get(user_id)
+        if inner_uid is None:
+            return {}
+        movie_ids = factors.item_ids[factors.rated_items(inner_uid)]
+        return dict(zip(movie_ids.tolist(), factors.rated_ratings(inner_uid).tolist()))
+
+    def fold_in(self, user_id, movie_ids, ratings=None):
+        """Update one user's factors and bias after new interactions
+
+        Item factors stay fixed and the trained [pu, bu] is the starting
+        point: the least-squares problem over the user's training ratings is
+        set up so the trained vector is its solution, then only the new or
+        changed ratings move it. For ALS this is exactly a re-solve; for SVD
+        it keeps the trained ranking instead of replacing it with a ridge
+        fit. Unrated watches count as FOLD_IN_WATCH_RATING. Users unknown to
+        the model start from zero.
+        """
+        if ratings is None:
+            ratings = [None] * len(movie_ids)
+        new_interactions = {
+            int(movie_id): FOLD_IN_WATCH_RATING if rating is None or np.isnan(rating) else float(rating)
+            for movie_id, rating in zip(movie_ids, ratings)
+        }
+        with self.lock:
+            self._fold_in(self.serving, int(user_id), new_interactions)
+
+    def _fold_in(self, serving, user_id, new_interactions):
+        factors = serving.factors
+        interactions = self._interactions(serving, user_id)
+        interactions.update(new_interactions)
+
+        trained = self._trained_interactions(factors, user_id)
+        added = [movie_id for movie_id in interactions if movie_id not in trained]
+        changed = [movie_id for movie_id in interactions
+                   if movie_id in trained and interactions[movie_id] != trained[movie_id]]
+        if not added and not changed:
+            # Nothing beyond the training data: the trained factors stand
+            serving.user_overrides.pop(user_id, None)
+            return
+
+        # Normal equations of r - mu - bi = [qi, 1] . [pu, bu] over the
+        # training ratings, with the right-hand side chosen so that the
+        # trained [pu, bu] solves them
+        n_factors = factors.qi.shape[1]
+        inner_uid = factors.user_index.get(user_id)
+        solution = np.zeros(n_factors + 1)
+        gram = np.zeros((n_factors + 1, n_factors + 1))
+        if inner_uid is not None:
+            solution[:n_factors] = factors.pu[inner_uid]
+            solution[n_factors] = factors.bu[inner_uid]
+            design = self._design(factors, np.fromiter(trained, dtype=np.int64, count=len(trained)))
+            gram += design.T @ design + FOLD_IN_REG * len(trained) * np.eye(n_factors + 1)
+        rhs = gram @ solution
+
+        if added:
+            added_ids = np.array(added, dtype=np.int64)
+            design = self._design(factors, added_ids)
+            inner = factors.item_inner_ids(added_ids)
+            item_bias = np.where(inner >= 0, factors.bi[np.maximum(inner, 0)], 0)
+            values = np.array([interactions[movie_id] for movie_id in added])
+            target = values - factors.global_mean - item_bias
+            gram += design.T @ design + FOLD_IN_REG * len(added) * np.eye(n_factors + 1)
+            rhs += design.T @ target
+        if changed:
+            # Only the rating moves; mu and bi cancel
+            design = self._design(factors, np.array(changed, dtype=np.int64))
+            rhs += design.T @ np.array([interactions[m] - trained[m] for m in changed])
+        solution = np.linalg.solve(gram, rhs)
+
+        rated_ids = np.fromiter(interactions, dtype=np.int64, count=len(interactions))
+        positions = self.catalog.positions(rated_ids)
+        serving.user_overrides[user_id] = {
+            'pu': solution[:n_factors],
+            'bu': solution[n_factors],
+            'interactions': interactions,
+            'rated_positions': positions[positions >= 0],
+            'revision': next(_revisions),
+        }
+
+    @staticmethod
+    def _design(factors, movie_ids):
+        """[qi, 1] rows for movie ids; movies unknown to the model have zero factors"""
+        inner = factors.item_inner_ids(movie_ids)
+        known = inner >= 0
+        design = np.zeros((len(movie_ids), factors.qi.shape[1] + 1))
+        design[known, :-1] = factors.qi[inner[known]]
+        design[:, -1] = 1
+        return design
+
+    def rank_items(self, user_id, k):
+        """Catalog positions and scores of the user's k best unseen movies
+
+        Users without online updates are served from the precomputed table
+        while it matches the serving model. Otherwise rankings are cached per
+        user at RANKING_CACHE_DEPTH or more, so paging and repeat requests
+        are slices until the model or the user changes.
+        """
+        # A cleared user dropdown sends None; rank it like any unknown user
+        user_id = -1 if user_id is None else int(user_id)
+        serving = self.serving
+        override = serving.user_overrides.get(user_id)
+
+        precomputed = self.precomputed
+        if (override is None and precomputed is not None and serving.factors.version is not None
+                and precomputed.model_version == serving.factors.version):
+            hit = precomputed.get(user_id, k)
+            if hit is not None:
+                movie_ids, scores = hit
+                return self.catalog.positions(movie_ids), scores
+        version = (serving.generation, override['revision'] if override else 0)
+
+        entry = self.ranking_cache.get(('user', user_id), version, k)
+        if entry is None:
+            depth = max(k, RANKING_CACHE_DEPTH)
+            positions, scores = self._rank(serving, user_id, depth)
+            entry = self.ranking_cache.put(('user', user_id), version, positions, scores,
+                                           complete=len(positions) < depth)
+        return entry.ids[:k], entry.scores[:k]
+
+    def _rank(self, serving, user_id, k):
+        scores = self.score_items(user_id, serving)
+        top = top_k(scores, k)
+        return top, scores[top]
+
     def get_top_n_recommendations(self, user_id, n=10, offset=0):
-        all_movies = self.movies_df['movieId'].unique()
-        predictions = [self.model.predict(user_id, movie_id) for movie_id in all_movies]
-        predictions.sort(key=lambda x: x.est, reverse=True)
-        recommendations = predictions[offset:offset + n]
-        
+        with timer('stage_seconds', stage='scoring'):
+            positions, scores = self.rank_items(user_id, offset + n)
+
+        with timer('stage_seconds', stage='catalog'):
+            movies = self.catalog.records(positions[offset:])
+        with timer('stage_seconds', stage='tmdb'):
+            tmdb_infos = self.tmdb_api.get_many([(movie['movieId'], movie['title']) for movie in movies])
+
         detailed_recommendations = []
-        for pred in recommendations:
-            movie_info = self.movies_df[self.movies_df['movieId'] == pred.iid].iloc[0]
-            tmdb_info = self.tmdb_api.search_movie(movie_info['title'])
-            
+        for movie_info, score, tmdb_info in zip(movies, scores[offset:], tmdb_infos):
             detailed_recommendations.append({
-                'movieId': int(pred.iid),  
+                'movieId': movie_info['movieId'],
                 'title': movie_info['title'],
-                'predicted_rating': round(pred.est, 2),
+                'predicted_rating': round(float(score), 2),
                 'genres': movie_info['genres'],
                 **tmdb_info
             })
-            
-        return detailed_recommendations
\ No newline at end of file
+
+        return detailed_recommendations
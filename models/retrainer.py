@@ -0,0 +1,171 @@
+import multiprocessing
+import os
+import shutil
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from config.config import (RATINGS_FILE, USER_HISTORY_FILE, FOLD_IN_WATCH_RATING,
+                           RETRAIN_INTERVAL, RETRAIN_EVENT_THRESHOLD, RETRAIN_CHECK_INTERVAL,
+                           RETRAIN_HOLDOUT_SIZE, RETRAIN_MAX_RMSE, RETRAIN_DIR, RETRAIN_POINTER_FILE,
+                           MODEL_DIR, MODEL_MMAP_MODE)
+from models.artifacts import artifact_key, load_artifact, save_artifact, save_pointer
+from models.ratings import load_ratings
+from models.recommender import train_model, trainer_params
+from models.user_history import HISTORY_COLUMNS, empty_history, read_history_file
+from utils.metrics import increment, observe
+
+
+def build_training_ratings():
+    """MovieLens ratings plus app interactions, one row per user and movie"""
+    try:
+        app_history, _ = read_history_file()
+    except FileNotFoundError:
+        app_history = empty_history()
+    app_history['rating'] = app_history['rating'].fillna(FOLD_IN_WATCH_RATING)
+
+    ratings = pd.concat([load_ratings()[HISTORY_COLUMNS], app_history], ignore_index=True)
+    ratings = ratings.sort_values('timestamp', kind='stable')
+    return ratings.drop_duplicates(subset=['userId', 'movieId'], keep='last')
+
+
+def split_holdout(ratings, size=RETRAIN_HOLDOUT_SIZE, seed=0):
+    """Split off a random sample of MovieLens ratings to validate on
+
+    App interactions always stay in the training ratings.
+    """
+    rng = np.random.default_rng(seed)
+    candidates = np.flatnonzero((ratings['source'] == 'movielens').to_numpy())
+    held_out = np.zeros(len(ratings), dtype=bool)
+    held_out[rng.choice(candidates, min(size, len(candidates)), replace=False)] = True
+    return ratings[~held_out], ratings[held_out]
+
+
+def rmse(factors, ratings):
+    """RMSE of the factor model on (userId, movieId, rating) rows"""
+    if len(ratings) == 0:
+        return float('nan')
+    estimates = factors.predict(ratings['userId'].to_numpy(), ratings['movieId'].to_numpy())
+    return float(np.sqrt(np.mean((estimates - ratings['rating'].to_numpy()) ** 2)))
+
+
+def retrain(directory):
+    """Fit the model on ratings plus app history and save it as an artifact
+
+    Runs in a worker process so training never blocks the server. The
+    held-out ratings are not trained on, so their RMSE measures how well the
+    model generalises rather than how well it memorised.
+    """
+    started = time.time()
+    ratings, holdout = split_holdout(build_training_ratings())
+    params = trainer_params()
+    # No history file yet counts as no app interactions
+    history_key = artifact_key(USER_HISTORY_FILE, {}) if os.path.exists(USER_HISTORY_FILE) else None
+    key = artifact_key(RATINGS_FILE, {**params, 'history': history_key, 'holdout': RETRAIN_HOLDOUT_SIZE})
+    factors = train_model(ratings, version=key[:12])
+    save_artifact(factors, directory, key)
+    return {
+        'directory': directory,
+        'key': key,
+        'base_key': artifact_key(RATINGS_FILE, params),
+        'rmse': rmse(factors, holdout),
+        'n_ratings': len(ratings),
+        'duration': time.time() - started,
+    }
+
+
+class RetrainScheduler:
+    """Retrains the recommender in a separate process and hot-swaps the result
+
+    A retrain starts once RETRAIN_INTERVAL has passed or RETRAIN_EVENT_THRESHOLD
+    new app interactions have been recorded since the last attempt.
+    """
+
+    def __init__(self, recommender, user_history, interval=RETRAIN_INTERVAL,
+                 event_threshold=RETRAIN_EVENT_THRESHOLD, check_interval=RETRAIN_CHECK_INTERVAL):
+        self.recommender = recommender
+        self.user_history = user_history
+        self.interval = interval
+        self.event_threshold = event_threshold
+        self.check_interval = check_interval
+        self.last_trained = time.time()
+        self.events_at_last_train = user_history.events_added
+        self.current_directory = None
+        # spawn, not fork: the server process is multi-threaded
+        self.executor = ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn'))
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self._run, name='retrain-scheduler', daemon=True)
+
+    def start(self):
+        self.prune()
+        self.thread.start()
+
+    def prune(self):
+        """Delete retrained artifacts left by earlier runs, except the one being served"""
+        serving = os.path.abspath(self.recommender.artifact_directory or MODEL_DIR)
+        if not os.path.isdir(RETRAIN_DIR):
+            return
+        for name in os.listdir(RETRAIN_DIR):
+            path = os.path.join(RETRAIN_DIR, name)
+            if os.path.abspath(path) == serving:
+                self.current_directory = path
+            elif os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+
+    def stop(self):
+        self.stop_event.set()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def due(self):
+        new_events = self.user_history.events_added - self.events_at_last_train
+        return new_events >= self.event_threshold or time.time() - self.last_trained >= self.interval
+
+    def _run(self):
+        while not self.stop_event.wait(self.check_interval):
+            if self.due():
+                try:
+                    self.retrain_now()
+                except Exception as e:
+                    increment('retrains_total', result='failed')
+                    print(f"Error retraining model: {e}")
+
+    def validate(self, factors, result):
+        if factors is None or len(factors.item_ids) == 0:
+            return False
+        arrays = (factors.pu, factors.qi, factors.bu, factors.bi)
+        if not all(np.isfinite(array).all() for array in arrays):
+            return False
+        # NaN (nothing held out) fails the comparison
+        return result['rmse'] <= RETRAIN_MAX_RMSE
+
+    def retrain_now(self):
+        """Train in the worker process, validate, then swap the new model in"""
+        self.user_history.flush()
+        # Every attempt resets the trigger, so a failing or rejected retrain
+        # waits for the next interval or event threshold instead of rerunning
+        # on every check
+        self.last_trained = time.time()
+        self.events_at_last_train = self.user_history.events_added
+        directory = os.path.join(RETRAIN_DIR, time.strftime('%Y%m%d-%H%M%S'))
+
+        result = self.executor.submit(retrain, directory).result()
+        factors = load_artifact(directory, result['key'], MODEL_MMAP_MODE)
+        observe('model_train_seconds', result['duration'], trainer='retrain')
+        if not self.validate(factors, result):
+            increment('retrains_total', result='rejected')
+            print(f"Rejected retrained model {result['key'][:12]} (holdout RMSE {result['rmse']:.3f})")
+            shutil.rmtree(directory, ignore_errors=True)
+            return False
+
+        self.recommender.set_factors(factors)
+        save_pointer(RETRAIN_POINTER_FILE, directory, result['key'], result['base_key'])
+        increment('retrains_total', result='swapped')
+        print(f"Swapped in model {factors.version} trained on {result['n_ratings']} ratings "
+              f"in {result['duration']:.1f}s (holdout RMSE {result['rmse']:.3f})")
+
+        # Only the serving artifact is kept; the pointer no longer names the old one
+        if self.current_directory is not None:
+            shutil.rmtree(self.current_directory, ignore_errors=True)
+        self.current_directory = directory
+        return True
@@ -0,0 +1,132 @@
+import re
+import unicodedata
+from collections import defaultdict
+import numpy as np
+from config.config import SEARCH_RESULT_LIMIT
+
+_NON_ALNUM = re.compile(r'[^a-z0-9]+')
+# MovieLens stores "Godfather, The (1972)"; also index "The Godfather (1972)"
+_TRAILING_ARTICLE = re.compile(r'^(.*), (The|A|An|Les|Le|La|L\'|Il|El|Das|Der|Die)( \(.*\))?$')
+
+
+def normalize(text):
+    """Lowercase ASCII with punctuation collapsed to single spaces"""
+    text = unicodedata.normalize('NFKD', str(text)).encode('ascii', 'ignore').decode()
+    return _NON_ALNUM.sub(' ', text.lower()).strip()
+
+
+def article_first(title):
+    match = _TRAILING_ARTICLE.match(str(title))
+    if match is None:
+        return title
+    return f"{match.group(2)} {match.group(1)}{match.group(3) or ''}"
+
+
+def trigrams(text):
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class TitleIndex:
+    """Prefix and trigram index over movie titles, ranked by popularity
+
+    Every query token must prefix-match a title token; titles whose
+    normalized form starts with the query rank first. When that yields too
+    few results, titles sharing the most trigrams with the query fill the
+    rest, which tolerates typos.
+    """
+
+    def __init__(self, titles, popularity):
+        normalized = [normalize(title) for title in titles]
+        self.normalized = np.array(normalized, dtype=object)
+        self.article_first = np.array([normalize(article_first(title)) for title in titles], dtype=object)
+        self.popularity = np.asarray(popularity)
+        # Most popular first; used to order every result set
+        self.rank = np.empty(len(normalized), dtype=np.int64)
+        self.rank[np.argsort(-self.popularity, kind='stable')] = np.arange(len(normalized))
+
+        tokens, postings = [], []
+        grams = defaultdict(list)
+        for position, title in enumerate(normalized):
+            for token in set(title.split()):
+                tokens.append(token)
+                postings.append(position)
+            for gram in trigrams(title) | trigrams(self.article_first[position]):
+                grams[gram].append(position)
+        order = np.argsort(np.array(tokens, dtype=str), kind='stable')
+        self.tokens = np.array(tokens, dtype=str)[order]
+        self.token_postings = np.array(postings, dtype=np.int32)[order]
+        self.trigram_postings = {gram: np.array(p, dtype=np.int32) for gram, p in grams.items()}
+
+    def _token_prefix(self, prefix):
+        start = np.searchsorted(self.tokens, prefix, side='left')
+        stop = np.searchsorted(self.tokens, prefix + '\uffff', side='left')
+        return np.unique(self.token_postings[start:stop])
+
+    def _by_rank(self, positions, limit):
+        positions = np.asarray(positions)
+        if len(positions) > limit:
+            positions = positions[np.argpartition(self.rank[positions], limit - 1)[:limit]]
+        return positions[np.argsort(self.rank[positions])]
+
+    def search(self, query, limit=SEARCH_RESULT_LIMIT):
+        """Catalog positions of the best matches for ``query``"""
+        query = normalize(query)
+        if not query:
+            return self._by_rank(np.arange(len(self.normalized)), limit)
+
+        matches = None
+        for token in query.split():
+            postings = self._token_prefix(token)
+            matches = postings if matches is None else np.intersect1d(matches, postings, assume_unique=True)
+            if len(matches) == 0:
+                break
+
+        results = []
+        if len(matches):
+            # Whole-title prefix matches first, then other token matches
+            starts = np.array([title.startswith(query) or alternate.startswith(query) for title, alternate
+                               in zip(self.normalized[matches], self.article_first[matches])], dtype=bool)
+            results = list(self._by_rank(matches[starts], limit))
+            if len(results) < limit:
+                results += list(self._by_rank(matches[~starts], limit - len(results)))
+
+        if len(results) < limit:
+            results += list(self._fuzzy(query, limit - len(results), exclude=results))
+        return np.array(results, dtype=np.int64)
+
+    def _fuzzy(self, query, limit, exclude=()):
+        postings = [self.trigram_postings[g] for g in trigrams(query) if g in self.trigram_postings]
+        if not postings:
+            return []
+        overlap = np.bincount(np.concatenate(postings), minlength=len(self.normalized))
+        overlap[list(exclude)] = 0
+        # Require at least half of the query's trigrams to match
+        candidates = np.flatnonzero(overlap >= max(1, len(trigrams(query)) // 2))
+        if len(candidates) > limit:
+            keys = overlap[candidates] * len(self.rank) - self.rank[candidates]
+            candidates = candidates[np.argpartition(-keys, limit - 1)[:limit]]
+        keys = overlap[candidates] * len(self.rank) - self.rank[candidates]
+        return candidates[np.argsort(-keys)]
+
+
+class UserIdIndex:
+    """Prefix search over numeric user ids, shortest ids first"""
+
+    def __init__(self, user_ids):
+        user_ids = np.unique(np.asarray(user_ids, dtype=np.int64))
+        as_text = user_ids.astype(str)
+        order = np.argsort(as_text)
+        self.text = as_text[order]
+        self.user_ids = user_ids[order]
+
+    def search(self, query, limit=SEARCH_RESULT_LIMIT):
+        if str(query).strip() and not re.search(r'\d', str(query)):
+            return self.user_ids[:0]
+        query = re.sub(r'\D', '', str(query))
+        start = np.searchsorted(self.text, query, side='left')
+        stop = np.searchsorted(self.text, query + ':', side='left')  # ':' sorts after '9'
+        matches = self.user_ids[start:stop]
+        if len(matches) > limit:
+            matches = np.partition(matches, limit - 1)[:limit]
+        return np.sort(matches)
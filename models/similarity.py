@@ -1,47 +1,343 @@
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
+import multiprocessing
+import os
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+import numpy as np
 import pandas as pd
-from config.config import MOVIES_FILE
+import scipy.sparse as sp
+from config.config import (SIMILARITY_TOP_K, SIMILARITY_BLOCK_SIZE, SIMILARITY_WORKERS, SIMILARITY_TAG_WEIGHT,
+                           HYBRID_SIMILARITY_FILE, MOVIES_FILE, TAGS_FILE, RANKING_CACHE_DEPTH, ANN_MIN_RATINGS)
+from models.ann import IVFIndex
+from models.artifacts import artifact_key
+from models.ranking_cache import RankedListCache
+from utils.metrics import timer
+from models.ratings import load_rating_columns
 
-class ItemSimilarity:
-    def __init__(self, tmdb_api):
-        self.movies_df = None
-        self.similarity_matrix = None
+
+def top_k_neighbors(features, k, block_size=SIMILARITY_BLOCK_SIZE, first_row=0, last_row=None):
+    """Top-k cosine neighbours of rows first_row..last_row of an L2-normalised sparse matrix
+
+    Rows are scored ``block_size`` at a time so peak memory stays at one
+    block_size x n_rows float32 buffer instead of the full n x n matrix.
+    Returns int32 neighbour indices and float32 scores, best first, with ties
+    ordered by row index and the row itself excluded.
+    """
+    n_rows = features.shape[0]
+    last_row = n_rows if last_row is None else last_row
+    k = min(k, n_rows - 1)
+    indices = np.empty((last_row - first_row, k), dtype=np.int32)
+    scores = np.empty((last_row - first_row, k), dtype=np.float32)
+    features = features.tocsr().astype(np.float32)
+
+    for start in range(first_row, last_row, block_size):
+        stop = min(start + block_size, last_row)
+        rows = np.arange(stop - start)
+        # Sparse x dense keeps the product dense without building a sparse result
+        block = np.ascontiguousarray((features @ features[start:stop].T.toarray()).T)
+        block[rows, start + rows] = -np.inf
+
+        top = np.argpartition(-block, k - 1, axis=1)[:, :k]
+        top.sort(axis=1)
+        top_scores = np.take_along_axis(block, top, axis=1)
+        order = np.argsort(-top_scores, axis=1, kind='stable')
+
+        indices[start - first_row:stop - first_row] = np.take_along_axis(top, order, axis=1)
+        scores[start - first_row:stop - first_row] = np.take_along_axis(top_scores, order, axis=1)
+
+    return indices, scores
+
+
+_worker_features = None
+
+
+def _init_worker(features):
+    global _worker_features
+    _worker_features = features
+
+
+def _top_k_rows(k, block_size, first_row, last_row):
+    return top_k_neighbors(_worker_features, k, block_size, first_row, last_row)
+
+
+def parallel_top_k_neighbors(features, k, workers=SIMILARITY_WORKERS, block_size=SIMILARITY_BLOCK_SIZE):
+    """top_k_neighbors with row ranges spread across a process pool
+
+    The features are sent to each worker once; every worker holds at most
+    one block buffer, so peak memory grows with the worker count, not with
+    the catalog squared.
+    """
+    n_rows = features.shape[0]
+    n_chunks = min(workers * 4, -(-n_rows // block_size))
+    if workers <= 1 or n_chunks <= 1:
+        return top_k_neighbors(features, k, block_size)
+
+    bounds = np.linspace(0, n_rows, n_chunks + 1).astype(int)
+    features = features.tocsr().astype(np.float32)
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+                             initializer=_init_worker, initargs=(features,)) as executor:
+        parts = list(executor.map(_top_k_rows, repeat(k), repeat(block_size), bounds[:-1], bounds[1:]))
+    return np.concatenate([p[0] for p in parts]), np.concatenate([p[1] for p in parts])
+
+
+def hybrid_features(catalog, tags_file=TAGS_FILE, tag_weight=SIMILARITY_TAG_WEIGHT):
+    """Genre and user-tag TF-IDF side by side, one row per catalog movie
+
+    Both blocks are L2-normalised and scaled so the cosine of two rows is
+    (1 - tag_weight) * genre similarity + tag_weight * tag similarity.
+    """
+    # scikit-learn is slow to import and only needed when building features
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    genres = pd.Series(catalog.genres).str.replace('|', ' ', regex=False)
+    genre_features = TfidfVectorizer(stop_words='english').fit_transform(genres)
+
+    tags = pd.read_csv(tags_file, usecols=['movieId', 'tag'], dtype={'movieId': np.int64, 'tag': str}).dropna()
+    tags['position'] = catalog.positions(tags['movieId'])
+    documents = tags[tags['position'] >= 0].groupby('position')['tag'].agg(' '.join)
+    corpus = np.full(len(catalog), '', dtype=object)
+    corpus[documents.index.to_numpy()] = documents.to_numpy()
+    try:
+        tag_features = TfidfVectorizer(stop_words='english', sublinear_tf=True, min_df=2).fit_transform(corpus)
+    except ValueError:
+        # No tag vocabulary, e.g. an empty tags file
+        return genre_features.tocsr()
+
+    return sp.hstack([genre_features * np.sqrt(1 - tag_weight),
+                      tag_features * np.sqrt(tag_weight)]).tocsr()
+
+
+class SimilarityModel:
+    """Shared paging and enrichment; subclasses implement ranked_similar"""
+
+    def __init__(self, tmdb_api, catalog):
+        self.catalog = catalog
         self.tmdb_api = tmdb_api
-        
-    def load_data(self):
-        self.movies_df = pd.read_csv(MOVIES_FILE)
-        
-        tfidf = TfidfVectorizer(stop_words='english')
-        tfidf_matrix = tfidf.fit_transform(self.movies_df['genres'].str.replace('|', ' ', regex=False))
-        
-        self.similarity_matrix = cosine_similarity(tfidf_matrix)
-        
+        self.ranking_cache = RankedListCache()
+
+    def ranked_similar(self, movie_idx, k):
+        raise NotImplementedError
+
     def get_similar_movies(self, movie_id, n=10, offset=0):
-        movie_idx = self.movies_df[self.movies_df['movieId'] == movie_id].index[0]
-        similar_scores = list(enumerate(self.similarity_matrix[movie_idx]))
-        
-        similar_scores = [
-        (idx, score)
-        for idx, score in similar_scores
-        if idx != movie_idx
-        ]
-        
-        similar_scores = sorted(similar_scores, key=lambda x: x[1], reverse=True)
-        
-        similar_movies = similar_scores[offset:offset + n]
-        
+        with timer('stage_seconds', stage='similarity'):
+            # Unknown ids (or a cleared dropdown) have no neighbours
+            movie_idx = self.catalog.position(movie_id) if movie_id is not None else -1
+            if movie_idx < 0:
+                return []
+            similar_indices, similar_scores = self.ranked_similar(movie_idx, offset + n)
+            similar_indices, similar_scores = similar_indices[offset:], similar_scores[offset:]
+
+        with timer('stage_seconds', stage='catalog'):
+            movies = self.catalog.records(similar_indices)
+        with timer('stage_seconds', stage='tmdb'):
+            tmdb_infos = self.tmdb_api.get_many([(movie['movieId'], movie['title']) for movie in movies])
+
         recommendations = []
-        for idx, score in similar_movies:
-            movie = self.movies_df.iloc[idx]
-            tmdb_info = self.tmdb_api.search_movie(movie['title'])
-            
+        for movie, score, tmdb_info in zip(movies, similar_scores, tmdb_infos):
             recommendations.append({
-                'movieId': int(movie['movieId']),  
+                'movieId': movie['movieId'],
                 'title': movie['title'],
-                'similarity_score': round(score, 2),
+                'similarity_score': round(float(score), 2),
                 'genres': movie['genres'],
                 **tmdb_info
             })
-            
-        return recommendations
\ No newline at end of file
+
+        return recommendations
+
+
+class ItemSimilarity(SimilarityModel):
+    def __init__(self, tmdb_api, catalog):
+        super().__init__(tmdb_api, catalog)
+        # Movies with the same genre string share one TF-IDF vector, so
+        # similarity is computed between genre-signature classes only
+        self.movie_class = None
+        self.class_indptr = None
+        self.class_members = None
+        self.class_self_scores = None
+        self.class_neighbor_indices = None
+        self.class_neighbor_scores = None
+        self.generation = 0  # bumped on every rebuild to invalidate cached rankings
+
+    def load_data(self):
+        from sklearn.feature_extraction.text import TfidfVectorizer
+        genres = pd.Series(self.catalog.genres).str.replace('|', ' ', regex=False)
+        signatures, self.movie_class = np.unique(genres.to_numpy(dtype=str), return_inverse=True)
+        self.movie_class = self.movie_class.astype(np.int32)
+
+        # IDF weights still come from the per-movie corpus
+        tfidf = TfidfVectorizer(stop_words='english')
+        tfidf.fit(genres)
+        class_features = tfidf.transform(signatures)
+
+        self.class_self_scores = np.asarray(
+            class_features.multiply(class_features).sum(axis=1), dtype=np.float32
+        ).ravel()
+        self.class_neighbor_indices, self.class_neighbor_scores = top_k_neighbors(
+            class_features, SIMILARITY_TOP_K
+        )
+
+        # Members of each class, most rated first, then by movieId
+        popularity = self.catalog.count_by_movie(load_rating_columns()['movieId'])
+        order = np.lexsort((self.catalog.movie_ids, -popularity, self.movie_class))
+        self.class_members = order.astype(np.int32)
+        self.class_indptr = np.zeros(len(signatures) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(self.movie_class, minlength=len(signatures)), out=self.class_indptr[1:])
+        self.generation += 1
+
+    def _members(self, class_idx):
+        return self.class_members[self.class_indptr[class_idx]:self.class_indptr[class_idx + 1]]
+
+    def rank_similar(self, movie_idx, n, offset=0):
+        """Row positions and scores of the movies ranked offset..offset+n
+
+        The ranking walks the movie's own class (minus the movie itself) and
+        then its neighbour classes, so only the classes covering the
+        requested page are touched.
+        """
+        movie_class = self.movie_class[movie_idx]
+        classes = np.concatenate(([movie_class], self.class_neighbor_indices[movie_class]))
+        class_scores = np.concatenate(([self.class_self_scores[movie_class]], self.class_neighbor_scores[movie_class]))
+        sizes = self.class_indptr[classes + 1] - self.class_indptr[classes]
+        sizes[0] -= 1
+        ends = np.cumsum(sizes)
+
+        positions, scores = [], []
+        segment = np.searchsorted(ends, offset, side='right')
+        skip = offset - (ends[segment - 1] if segment > 0 else 0)
+        while segment < len(classes) and len(positions) < n:
+            members = self._members(classes[segment])
+            if segment == 0:
+                members = members[members != movie_idx]
+            taken = members[skip:skip + n - len(positions)]
+            positions.extend(taken)
+            scores.extend([class_scores[segment]] * len(taken))
+            segment += 1
+            skip = 0
+
+        return np.asarray(positions, dtype=np.int64), np.asarray(scores, dtype=np.float32)
+
+    def ranked_similar(self, movie_idx, k):
+        """The first k neighbours of a movie, served from the ranking cache"""
+        key = ('content', int(movie_idx))
+        entry = self.ranking_cache.get(key, self.generation, k)
+        if entry is None:
+            depth = max(k, RANKING_CACHE_DEPTH)
+            positions, scores = self.rank_similar(movie_idx, depth)
+            entry = self.ranking_cache.put(key, self.generation, positions, scores,
+                                           complete=len(positions) < depth)
+        return entry.ids[:k], entry.scores[:k]
+
+
+class HybridSimilarity(SimilarityModel):
+    """Per-movie neighbours from genre plus user-tag TF-IDF
+
+    The top-K table is built once across a process pool and saved to
+    HYBRID_SIMILARITY_FILE; later starts only load the two arrays.
+    """
+
+    def __init__(self, tmdb_api, catalog, tags_file=TAGS_FILE, tag_weight=SIMILARITY_TAG_WEIGHT,
+                 path=HYBRID_SIMILARITY_FILE):
+        super().__init__(tmdb_api, catalog)
+        self.tags_file = tags_file
+        self.tag_weight = tag_weight
+        self.path = path
+        self.neighbor_indices = None
+        self.neighbor_scores = None
+        self.generation = 0
+
+    def load_data(self):
+        params = {'movies': artifact_key(MOVIES_FILE, {}), 'tag_weight': self.tag_weight, 'top_k': SIMILARITY_TOP_K}
+        key = artifact_key(self.tags_file, params)
+        if not self._load(key):
+            print("Building hybrid similarity index...")
+            features = hybrid_features(self.catalog, self.tags_file, self.tag_weight)
+            self.neighbor_indices, self.neighbor_scores = parallel_top_k_neighbors(features, SIMILARITY_TOP_K)
+            self._save(key)
+        self.generation += 1
+
+    def _load(self, key):
+        try:
+            with np.load(self.path) as saved:
+                if str(saved['key']) != key:
+                    return False
+                self.neighbor_indices = saved['indices']
+                self.neighbor_scores = saved['scores']
+        except (FileNotFoundError, KeyError, ValueError):
+            return False
+        return len(self.neighbor_indices) == len(self.catalog)
+
+    def _save(self, key):
+        directory = os.path.dirname(self.path)
+        os.makedirs(directory, exist_ok=True)
+        # A temp file per writer, so processes building at once never share one
+        with tempfile.NamedTemporaryFile(dir=directory, suffix='.tmp', delete=False) as f:
+            np.savez(f, key=np.array(key), indices=self.neighbor_indices, scores=self.neighbor_scores)
+        os.replace(f.name, self.path)
+
+    def ranked_similar(self, movie_idx, k):
+        # Rows are already ranked, so a page is a slice
+        return self.neighbor_indices[movie_idx, :k], self.neighbor_scores[movie_idx, :k]
+
+
+class FactorSimilarity(SimilarityModel):
+    """Behavioural neighbours: cosine similarity of the SVD item factors
+
+    Served from an IVF index over the recommender's current model, holding
+    the items with at least ANN_MIN_RATINGS training ratings. When the
+    recommender swaps in a new model the index is rebuilt in the background
+    and the previous one keeps serving until it is ready.
+    """
+
+    def __init__(self, tmdb_api, catalog, recommender):
+        super().__init__(tmdb_api, catalog)
+        self.recommender = recommender
+        # (serving model, index) swapped as one reference
+        self.state = None
+        self.lock = threading.Lock()
+        self.rebuilding = False
+
+    def load_data(self):
+        self.state = self._build(self.recommender.serving)
+
+    def _build(self, serving):
+        factors = serving.factors
+        support = np.bincount(factors.rated_indices, minlength=len(factors.item_ids))
+        known = np.flatnonzero((serving.item_positions >= 0) & (support >= ANN_MIN_RATINGS))
+        index = IVFIndex(factors.qi[known], serving.item_positions[known])
+        return serving, index
+
+    def _rebuild(self, serving):
+        try:
+            self.state = self._build(serving)
+        except Exception as e:
+            print(f"Error rebuilding factor similarity index: {e}")
+        finally:
+            self.rebuilding = False
+
+    def current(self):
+        """The serving model and index to answer from, rebuilding if stale"""
+        serving = self.recommender.serving
+        if self.state is None:
+            self.load_data()
+        elif self.state[0] is not serving and not self.rebuilding:
+            with self.lock:
+                if not self.rebuilding:
+                    self.rebuilding = True
+                    threading.Thread(target=self._rebuild, args=(serving,), daemon=True).start()
+        return self.state
+
+    def ranked_similar(self, movie_idx, k):
+        serving, index = self.current()
+        key = ('collaborative', int(movie_idx))
+        entry = self.ranking_cache.get(key, serving.generation, k)
+        if entry is None:
+            query = serving.catalog_qi[movie_idx]
+            if not query.any():
+                # The model has no factors for this movie
+                positions, scores, complete = np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32), True
+            else:
+                depth = max(k, RANKING_CACHE_DEPTH)
+                positions, scores, exhaustive = index.search(query, depth, exclude=movie_idx)
+                complete = exhaustive and len(positions) < depth
+            entry = self.ranking_cache.put(key, serving.generation, positions, scores, complete)
+        return entry.ids[:k], entry.scores[:k]
@@ -1,74 +1,209 @@
+import json
 import requests
+import threading
 import time
-from datetime import datetime, timedelta
-from config.config import TMDB_API_KEY, TMDB_BASE_URL, TMDB_IMAGE_BASE_URL
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+from requests.adapters import HTTPAdapter
+from config.config import (TMDB_API_KEY, TMDB_BASE_URL, TMDB_IMAGE_BASE_URL, LINKS_FILE,
+                           TMDB_METADATA_FILE, TMDB_MAX_WORKERS, TMDB_RATE_LIMIT, TMDB_TIMEOUT,
+                           TMDB_OFFLINE)
+from models.metadata_store import MetadataStore
+from utils.metrics import increment, timer
+
+NO_POSTER_URL = "https://via.placeholder.com/500x750?text=No+Poster+Available"
+ERROR_POSTER_URL = "https://via.placeholder.com/500x750?text=Error+Loading+Poster"
+
+
+def load_metadata_file(path=TMDB_METADATA_FILE):
+    """Read a prefetched metadata file into {movieId: info}
+
+    The file is append-only JSON lines, so later lines win.
+    """
+    metadata = {}
+    try:
+        with open(path) as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # torn last line from an interrupted prefetch
+                metadata[record['movieId']] = record['info']
+    except FileNotFoundError:
+        pass
+    return metadata
+
+
+def empty_movie_info(poster_url=NO_POSTER_URL):
+    return {
+        'poster_url': poster_url,
+        'overview': '',
+        'release_date': '',
+        'vote_average': 0
+    }
+
+
+class TokenBucket:
+    """Thread-safe token bucket allowing ``rate`` calls per second on average"""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a token is available, then take it"""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
 
 class TMDBApi:
-    def __init__(self):
+    def __init__(self, store=None, base_url=TMDB_BASE_URL, max_workers=TMDB_MAX_WORKERS,
+                 rate_limit=TMDB_RATE_LIMIT, timeout=TMDB_TIMEOUT,
+                 metadata_file=TMDB_METADATA_FILE, offline=TMDB_OFFLINE):
         self.api_key = TMDB_API_KEY
-        self.base_url = TMDB_BASE_URL
+        self.base_url = base_url
         self.image_base_url = TMDB_IMAGE_BASE_URL
-        self.cache = {}
-        self.cache_timestamps = {}
+        self.timeout = timeout
+        self.offline = offline
+        self.store = store if store is not None else MetadataStore()
+        self.tmdb_ids = self._load_links()
+        # Prefetched catalog metadata never expires and needs no network
+        self.catalog_metadata = load_metadata_file(metadata_file) if metadata_file else {}
+
+        # Keep-alive connections shared by all worker threads
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_workers)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.rate_limiter = TokenBucket(rate_limit)
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='tmdb')
+        self.in_flight = {}  # movie_id -> Future, so concurrent pages share lookups
+        self.in_flight_lock = threading.RLock()
 
-    def _is_cache_valid(self, key):
-        if key not in self.cache_timestamps:
-            return False
-        return (datetime.now() - self.cache_timestamps[key]).seconds < 3600
+    def _load_links(self):
+        """Map MovieLens movieId to tmdbId from links.csv"""
+        try:
+            links = pd.read_csv(LINKS_FILE, usecols=['movieId', 'tmdbId']).dropna()
+        except FileNotFoundError:
+            return {}
+        return dict(zip(links['movieId'].astype(int), links['tmdbId'].astype(int)))
 
-    def search_movie(self, movie_title):
-        # Check cache first
-        if movie_title in self.cache and self._is_cache_valid(movie_title):
-            return self.cache[movie_title]
+    def _to_movie_info(self, movie_data):
+        poster_path = movie_data.get('poster_path')
+        return {
+            'poster_url': f"{self.image_base_url}{poster_path}" if poster_path else NO_POSTER_URL,
+            'overview': movie_data.get('overview') or '',
+            'release_date': movie_data.get('release_date') or '',
+            'vote_average': movie_data.get('vote_average', 0)
+        }
 
+    def _get(self, path, **params):
+        self.rate_limiter.acquire()
+        endpoint = 'search' if path.startswith('/search') else 'movie'
+        status = 'error'
         try:
-            clean_title = movie_title.split('(')[0].strip()
-            
-            endpoint = f"{self.base_url}/search/movie"
-            params = {
-                'api_key': self.api_key,
-                'query': clean_title,
-                'language': 'en-US'
-            }
-            
-            response = requests.get(endpoint, params=params)
-            data = response.json()
-            
-            if data.get('results'):
-                movie_data = data['results'][0]
-                poster_path = movie_data.get('poster_path')
-                if poster_path:
-                    poster_url = f"{self.image_base_url}{poster_path}"
-                else:
-                    poster_url = "https://via.placeholder.com/500x750?text=No+Poster+Available"
-                
-                # Additional movie details
-                movie_info = {
-                    'poster_url': poster_url,
-                    'overview': movie_data.get('overview', ''),
-                    'release_date': movie_data.get('release_date', ''),
-                    'vote_average': movie_data.get('vote_average', 0)
-                }
-            else:
-                movie_info = {
-                    'poster_url': "https://via.placeholder.com/500x750?text=No+Poster+Available",
-                    'overview': '',
-                    'release_date': '',
-                    'vote_average': 0
-                }
-
-            # Update cache
-            self.cache[movie_title] = movie_info
-            self.cache_timestamps[movie_title] = datetime.now()
-            
-            time.sleep(0.1)  # Rate limiting
-            return movie_info
+            with timer('tmdb_request_seconds', endpoint=endpoint):
+                response = self.session.get(
+                    f"{self.base_url}{path}",
+                    params={'api_key': self.api_key, 'language': 'en-US', **params},
+                    timeout=self.timeout
+                )
+            status = str(response.status_code)
+            return response
+        finally:
+            increment('tmdb_requests_total', endpoint=endpoint, status=status)
 
+    def _fetch_by_id(self, tmdb_id):
+        """Movie details by tmdbId, or None when TMDB does not know the id"""
+        response = self._get(f"/movie/{tmdb_id}")
+        if response.status_code == 404:
+            return None
+        response.raise_for_status()
+        return response.json()
+
+    def _search(self, movie_title):
+        """First title-search result, or None when nothing matches"""
+        clean_title = movie_title.split('(')[0].strip()
+        response = self._get("/search/movie", query=clean_title)
+        results = response.json().get('results')
+        return results[0] if results else None
+
+    def fetch_movie(self, movie_id):
+        """Fetch a catalog movie by its tmdbId, bypassing every cache
+
+        Returns the card info and whether TMDB knew the movie. Network errors
+        propagate so callers can retry.
+        """
+        tmdb_id = self.tmdb_ids.get(movie_id)
+        movie_data = self._fetch_by_id(tmdb_id) if tmdb_id else None
+        if movie_data is None:
+            return empty_movie_info(), False
+        return self._to_movie_info(movie_data), True
+
+    def _lookup(self, movie_id, movie_title):
+        """Fetch a movie from TMDB and store the result"""
+        tmdb_id = self.tmdb_ids.get(movie_id)
+        try:
+            movie_data = self._fetch_by_id(tmdb_id) if tmdb_id else None
+            if movie_data is None:
+                movie_data = self._search(movie_title)
         except Exception as e:
             print(f"Error fetching movie data for {movie_title}: {str(e)}")
-            return {
-                'poster_url': "https://via.placeholder.com/500x750?text=Error+Loading+Poster",
-                'overview': '',
-                'release_date': '',
-                'vote_average': 0
-            }
\ No newline at end of file
+            return empty_movie_info(ERROR_POSTER_URL)
+
+        movie_info = self._to_movie_info(movie_data) if movie_data else empty_movie_info()
+        self.store.put(movie_id, movie_info, found=movie_data is not None, tmdb_id=tmdb_id)
+        return movie_info
+
+    def _submit(self, movie_id, movie_title):
+        """Start a lookup, or join the one already running for this movie"""
+        with self.in_flight_lock:
+            future = self.in_flight.get(movie_id)
+            if future is None:
+                future = self.executor.submit(self._lookup, movie_id, movie_title)
+                self.in_flight[movie_id] = future
+                future.add_done_callback(lambda _: self._forget(movie_id))
+            return future
+
+    def _forget(self, movie_id):
+        with self.in_flight_lock:
+            self.in_flight.pop(movie_id, None)
+
+    def get_many(self, movies):
+        """Details for a list of (movieId, title) pairs, in the same order
+
+        Cache misses are fetched concurrently, so a page costs roughly one
+        round-trip instead of one per card.
+        """
+        movie_ids = [int(movie_id) for movie_id, _ in movies]
+        cached = {movie_id: self.catalog_metadata[movie_id]
+                  for movie_id in movie_ids if movie_id in self.catalog_metadata}
+        snapshot_hits = len(cached)
+        if len(cached) < len(movie_ids):
+            cached.update(self.store.get_many([m for m in movie_ids if m not in cached]))
+        increment('tmdb_cache_lookups_total', snapshot_hits, result='snapshot')
+        increment('tmdb_cache_lookups_total', len(cached) - snapshot_hits, result='store')
+        increment('tmdb_cache_lookups_total', len(movie_ids) - len(cached), result='miss')
+        if self.offline:
+            return [cached.get(movie_id) or empty_movie_info() for movie_id in movie_ids]
+
+        futures = {}
+        for movie_id, (_, movie_title) in zip(movie_ids, movies):
+            if movie_id not in cached and movie_id not in futures:
+                futures[movie_id] = self._submit(movie_id, movie_title)
+
+        return [
+            cached[movie_id] if movie_id in cached else futures[movie_id].result()
+            for movie_id in movie_ids
+        ]
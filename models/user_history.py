@@ -1,110 +1,550 @@
+import atexit
+import calendar
+import csv
+import io
+import os
+import threading
+import time
+from contextlib import contextmanager
+import numpy as np
 import pandas as pd
-from datetime import datetime
-from config.config import RATINGS_FILE
+from config.config import (USER_HISTORY_FILE, HISTORY_FSYNC_EVERY, HISTORY_FSYNC_INTERVAL,
+                           HISTORY_COMPACT_EVERY, HISTORY_FOLLOW_INTERVAL)
+from models.ratings import load_ratings, SOURCES
+from utils.metrics import timer
+
+try:
+    import fcntl
+except ImportError:
+    # No advisory locks (Windows): only run a single server process there
+    fcntl = None
+
+HISTORY_COLUMNS = ['userId', 'movieId', 'timestamp', 'rating', 'source']
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+def empty_history():
+    return pd.DataFrame({
+        'userId': pd.Series(dtype=np.int32),
+        'movieId': pd.Series(dtype=np.int32),
+        'timestamp': pd.Series(dtype=np.int64),
+        'rating': pd.Series(dtype=np.float32),
+        'source': pd.Categorical([], categories=SOURCES),
+    })
+
+
+def events_frame(events):
+    """DataFrame of (userId, movieId, timestamp, rating, source) tuples"""
+    user_ids, movie_ids, timestamps, ratings, sources = zip(*events) if events else ([],) * 5
+    return pd.DataFrame({
+        'userId': np.array(user_ids, dtype=np.int32),
+        'movieId': np.array(movie_ids, dtype=np.int32),
+        'timestamp': np.array(timestamps, dtype=np.int64),
+        'rating': np.array(ratings, dtype=np.float32),
+        'source': pd.Categorical(sources, categories=SOURCES),
+    })
+
+
+def format_timestamp(timestamp):
+    """Render epoch seconds the way user_history.csv stores them"""
+    return pd.to_datetime(timestamp, unit='s').strftime(TIMESTAMP_FORMAT)
+
+
+def parse_journal_lines(data):
+    """Events from complete CSV lines of user_history.csv, skipping the header and malformed rows"""
+    events = []
+    for row in csv.reader(io.StringIO(data.decode('utf-8', errors='replace'))):
+        try:
+            user_id, movie_id, timestamp, rating = row[:4]
+            events.append((int(user_id), int(movie_id),
+                           calendar.timegm(time.strptime(timestamp, TIMESTAMP_FORMAT)),
+                           float(rating) if rating else np.nan,
+                           row[4] if len(row) > 4 and row[4] in SOURCES else 'app'))
+        except ValueError:
+            continue  # header, torn or hand-edited line
+    return events
+
+
+@contextmanager
+def journal_lock(shared=False, path=USER_HISTORY_FILE):
+    """Advisory lock on the journal, shared across processes
+
+    Appends and compactions hold it exclusively; followers take it shared
+    while they switch to a compacted file. The lock file also records
+    "<generation> <inode> <size>" of the last compaction, so followers know
+    where the compacted rows end and newer appends begin.
+    """
+    fd = os.open(path + '.lock', os.O_RDWR | os.O_CREAT, 0o644)
+    with os.fdopen(fd, 'r+') as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+        try:
+            yield lock_file
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def read_compaction_marker(lock_file):
+    """(generation, inode, size) of the last compaction, zeros before the first"""
+    lock_file.seek(0)
+    try:
+        generation, inode, size = map(int, lock_file.read().split())
+    except ValueError:
+        return 0, 0, 0
+    return generation, inode, size
+
+
+def read_history_file(path=USER_HISTORY_FILE):
+    """Parse user_history.csv, returning the valid rows and the raw row count"""
+    history = pd.read_csv(path, dtype=str)
+
+    # Timestamps are stored as readable strings; keep epoch seconds in memory
+    user_ids = pd.to_numeric(history['userId'], errors='coerce')
+    movie_ids = pd.to_numeric(history['movieId'], errors='coerce')
+    timestamps = pd.to_datetime(history['timestamp'], format=TIMESTAMP_FORMAT, errors='coerce')
+    valid = user_ids.notna() & movie_ids.notna() & timestamps.notna()
+    if not valid.all():
+        print(f"Skipped {int((~valid).sum())} malformed rows in {path}")
+
+    sources = history['source'] if 'source' in history.columns else pd.Series('app', index=history.index)
+    valid_history = pd.DataFrame({
+        'userId': user_ids[valid].astype(np.int32),
+        'movieId': movie_ids[valid].astype(np.int32),
+        'timestamp': ((timestamps[valid] - pd.Timestamp(0)) // pd.Timedelta(seconds=1)).astype(np.int64),
+        'rating': pd.to_numeric(history['rating'], errors='coerce')[valid].astype(np.float32),
+        'source': pd.Categorical(sources[valid].fillna('app'), categories=SOURCES),
+    }).reset_index(drop=True)
+    return valid_history, len(history)
+
+
+class UserHistoryIndex:
+    """Watch history grouped per user with running per-user statistics
+
+    Rows are sorted by user and newest first and stored as columns, with
+    CSR-style offsets per user. Events added after the index was built live in
+    a small per-user overlay and update the statistics incrementally, so reads
+    and writes only ever touch the affected user's rows.
+    """
+
+    def __init__(self, history):
+        history = history.iloc[np.lexsort((-history['timestamp'].to_numpy(), history['userId'].to_numpy()))]
+        # Remove duplicates (same user + movie combination, keep most recent)
+        history = history[~history.duplicated(subset=['userId', 'movieId'], keep='first')]
+
+        user_ids = history['userId'].to_numpy()
+        users, starts = np.unique(user_ids, return_index=True)
+        self.user_rows = {int(user): row for row, user in enumerate(users)}
+        self.indptr = np.append(starts, len(user_ids)).astype(np.int64)
+        self.movie_ids = history['movieId'].to_numpy(dtype=np.int32)
+        self.timestamps = history['timestamp'].to_numpy(dtype=np.int64)
+        self.ratings = history['rating'].to_numpy(dtype=np.float32)
+        self.source_codes = history['source'].cat.codes.to_numpy(dtype=np.int8)
+        self.overlay = {}  # userId -> {movieId: event}
+
+        starts = self.indptr[:-1]
+        counts = np.diff(self.indptr)
+        rated = ~np.isnan(self.ratings)
+        nonempty = counts > 0
+        self.count = counts
+        self.rating_sum = np.zeros(len(users))
+        self.rating_count = np.zeros(len(users), dtype=np.int64)
+        self.latest = np.zeros(len(users), dtype=np.int64)
+        if nonempty.any():
+            self.rating_sum[nonempty] = np.add.reduceat(np.where(rated, self.ratings, 0).astype(np.float64), starts[nonempty])
+            self.rating_count[nonempty] = np.add.reduceat(rated.astype(np.int64), starts[nonempty])
+            self.latest[nonempty] = self.timestamps[starts[nonempty]]
+        self.source_counts = np.zeros((len(users), len(SOURCES)), dtype=np.int64)
+        np.add.at(self.source_counts, (np.repeat(np.arange(len(users)), counts), self.source_codes), 1)
+
+    def _user_row(self, user_id):
+        row = self.user_rows.get(user_id)
+        if row is None:
+            # New users are rare, so growing the per-user arrays is fine
+            row = len(self.user_rows)
+            self.user_rows[user_id] = row
+            self.indptr = np.append(self.indptr, self.indptr[-1])
+            self.count = np.append(self.count, 0)
+            self.rating_sum = np.append(self.rating_sum, 0.0)
+            self.rating_count = np.append(self.rating_count, 0)
+            self.latest = np.append(self.latest, 0)
+            self.source_counts = np.vstack([self.source_counts, np.zeros(len(SOURCES), dtype=np.int64)])
+        return row
+
+    def _update_stats(self, row, rating, source_code, sign):
+        self.count[row] += sign
+        self.source_counts[row, source_code] += sign
+        if not np.isnan(rating):
+            self.rating_sum[row] += sign * float(rating)
+            self.rating_count[row] += sign
+
+    def add(self, event):
+        """Record (userId, movieId, timestamp, rating, source), replacing any older row"""
+        user_id, movie_id, timestamp, rating, source = event
+        row = self._user_row(user_id)
+        user_overlay = self.overlay.setdefault(user_id, {})
+
+        previous = user_overlay.get(movie_id)
+        if previous is not None:
+            self._update_stats(row, previous[3], SOURCES.index(previous[4]), -1)
+        else:
+            start, stop = self.indptr[row], self.indptr[row + 1]
+            match = np.flatnonzero(self.movie_ids[start:stop] == movie_id)
+            if len(match):
+                self._update_stats(row, self.ratings[start + match[0]], self.source_codes[start + match[0]], -1)
+
+        user_overlay[movie_id] = event
+        self._update_stats(row, rating, SOURCES.index(source), 1)
+        self.latest[row] = max(self.latest[row], timestamp)
+
+    def watched_at(self, user_id, movie_id):
+        """Timestamp of the user's row for a movie, or None"""
+        event = self.overlay.get(user_id, {}).get(movie_id)
+        if event is not None:
+            return event[2]
+        row = self.user_rows.get(user_id)
+        if row is None:
+            return None
+        start, stop = self.indptr[row], self.indptr[row + 1]
+        match = np.flatnonzero(self.movie_ids[start:stop] == movie_id)
+        return int(self.timestamps[start + match[0]]) if len(match) else None
+
+    def rows(self, user_id, limit=None):
+        """The user's history, newest first, as a DataFrame of at most ``limit`` rows"""
+        row = self.user_rows.get(user_id)
+        events = sorted(self.overlay.get(user_id, {}).values(), key=lambda e: e[2], reverse=True)
+        if row is None:
+            start = stop = 0
+        else:
+            start, stop = self.indptr[row], self.indptr[row + 1]
+            if limit is not None:
+                # Overlay events shadow at most len(events) indexed rows
+                stop = min(stop, start + limit + len(events))
+
+        base = pd.DataFrame({
+            'userId': np.full(stop - start, user_id, dtype=np.int32),
+            'movieId': self.movie_ids[start:stop],
+            'timestamp': self.timestamps[start:stop],
+            'rating': self.ratings[start:stop],
+            'source': pd.Categorical.from_codes(self.source_codes[start:stop], categories=SOURCES),
+        })
+        if events:
+            base = base[~base['movieId'].isin([e[1] for e in events])]
+            base = pd.concat([events_frame(events), base], ignore_index=True)
+            # Overlay rows come first so they win ties on timestamp
+            base = base.sort_values('timestamp', ascending=False, kind='stable')
+
+        return base.head(limit) if limit is not None else base
+
+    def stats(self, user_id):
+        row = self.user_rows.get(user_id)
+        if row is None or self.count[row] == 0:
+            return None
+        return {
+            'total_movies': int(self.count[row]),
+            'avg_rating': self.rating_sum[row] / self.rating_count[row] if self.rating_count[row] else 0,
+            'movielens_count': int(self.source_counts[row, SOURCES.index('movielens')]),
+            'app_count': int(self.source_counts[row, SOURCES.index('app')]),
+            'latest_watch': int(self.latest[row])
+        }
+
 
 class UserHistory:
+    """Watch history from MovieLens plus the app's append-only journal
+
+    Several server processes can share the journal: writes are serialised
+    with journal_lock, and each process follows the file to apply events the
+    others appended, so every worker sees every click.
+    """
+
     def __init__(self):
-        self.movielens_history = pd.DataFrame()
-        self.additional_history = pd.DataFrame()
-        self.combined_history = pd.DataFrame()
+        self.additional_history = empty_history()
+        self.index = None
+        self.journal = None
+        self.unsynced_events = 0
+        self.last_sync = time.monotonic()
+        self.uncompacted_rows = 0  # journal rows a compaction could drop or rewrite
+        self.events_added = 0  # app events since startup, used to trigger retraining
+        self.lock = threading.Lock()
+        # Read position in the journal; bytes before it are in the index
+        self.tail = None
+        self.journal_inode = None
+        self.journal_offset = 0
+        self.journal_generation = 0  # compactions seen, see journal_lock
+        self.listeners = []  # called with events appended by other processes
+        self.follower = None
         self.load_data()
+        atexit.register(self.flush)
 
     def load_data(self):
         """Load both MovieLens history and additional app history"""
         # Load MovieLens ratings as historical watch history
-        self.load_movielens_history()
-        
+        movielens_history = self.load_movielens_history()
+
         # Load additional history from app interactions
         self.load_additional_history()
-        
-        # Combine both histories
-        self.combine_histories()
+
+        # Combine both histories; only the index keeps the MovieLens rows
+        self.combine_histories(movielens_history)
 
     def load_movielens_history(self):
         """Load actual MovieLens ratings as watch history"""
         try:
-            ratings_df = pd.read_csv(RATINGS_FILE)
-            
-            # Convert timestamp from Unix timestamp to readable format
-            if 'timestamp' in ratings_df.columns:
-                ratings_df['timestamp'] = pd.to_datetime(ratings_df['timestamp'], unit='s').dt.strftime('%Y-%m-%d %H:%M:%S')
-                ratings_df['source'] = 'movielens'  # Mark source
-            else:
-                ratings_df['timestamp'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-                ratings_df['source'] = 'movielens'
-            
-            self.movielens_history = ratings_df[['userId', 'movieId', 'timestamp', 'rating', 'source']].copy()
-            print(f"Loaded {len(self.movielens_history)} MovieLens ratings")
-            
+            movielens_history = load_ratings()[HISTORY_COLUMNS]
+            print(f"Loaded {len(movielens_history)} MovieLens ratings")
+            return movielens_history
+
         except Exception as e:
             print(f"Error loading MovieLens history: {e}")
-            self.movielens_history = pd.DataFrame(columns=['userId', 'movieId', 'timestamp', 'rating', 'source'])
+            return empty_history()
 
     def load_additional_history(self):
         """Load additional history from app interactions"""
-        try:
-            self.additional_history = pd.read_csv('data/user_history.csv')
-            if 'source' not in self.additional_history.columns:
-                self.additional_history['source'] = 'app'
-            print(f"Loaded {len(self.additional_history)} additional watch records")
-        except FileNotFoundError:
-            self.additional_history = pd.DataFrame(columns=['userId', 'movieId', 'timestamp', 'rating', 'source'])
-            print("No additional history file found - starting fresh")
-
-    def combine_histories(self):
-        """Combine MovieLens and additional histories"""
-        if self.movielens_history.empty and self.additional_history.empty:
-            self.combined_history = pd.DataFrame(columns=['userId', 'movieId', 'timestamp', 'rating', 'source'])
-        elif self.movielens_history.empty:
-            self.combined_history = self.additional_history.copy()
-        elif self.additional_history.empty:
-            self.combined_history = self.movielens_history.copy()
-        else:
-            self.combined_history = pd.concat([self.movielens_history, self.additional_history], ignore_index=True)
-        
-        # Remove duplicates (same user + movie combination, keep most recent)
-        self.combined_history = self.combined_history.sort_values('timestamp', ascending=False)
-        self.combined_history = self.combined_history.drop_duplicates(subset=['userId', 'movieId'], keep='first')
+        # No appends while reading, so following starts exactly at the end
+        with journal_lock(shared=True) as lock_file:
+            self.journal_generation = read_compaction_marker(lock_file)[0]
+            self._open_tail()
+            try:
+                self.additional_history, raw_rows = read_history_file()
+            except FileNotFoundError:
+                self.additional_history = empty_history()
+                print("No additional history file found - starting fresh")
+                return
+
+        self.uncompacted_rows = raw_rows - len(self.additional_history.drop_duplicates(['userId', 'movieId']))
+        print(f"Loaded {len(self.additional_history)} additional watch records")
+
+    def combine_histories(self, movielens_history):
+        """Combine MovieLens and additional histories into the per-user index"""
+        # App rows go first so they win ties on timestamp
+        self.index = UserHistoryIndex(
+            pd.concat([self.additional_history, movielens_history], ignore_index=True)
+        )
 
     def add_to_history(self, user_id, movie_id, rating=None):
         """Add new watch history when 'Mark as Watched' is clicked"""
-        new_entry = {
-            'userId': int(user_id),
-            'movieId': int(movie_id),
-            'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-            'rating': rating,
-            'source': 'app'
-        }
-        
-        # Add to additional history
-        self.additional_history = pd.concat([self.additional_history, pd.DataFrame([new_entry])], ignore_index=True)
-        
-        # Save to CSV
-        self.save_additional_history()
-        
-        # Update combined history
-        self.combine_histories()
-        
+        event = (int(user_id), int(movie_id), int(time.time()),
+                 np.nan if rating is None else float(rating), 'app')
+
+        with self.lock, timer('history_write_seconds'), journal_lock() as lock_file:
+            self._catch_up(lock_file)
+            # Append to the journal instead of rewriting the whole file
+            self._append_to_journal(event)
+            self.index.add(event)
+            self.events_added += 1
+
+            self.uncompacted_rows += 1
+            if self.uncompacted_rows >= HISTORY_COMPACT_EVERY:
+                self._compact(lock_file)
+
         print(f"Added movie {movie_id} to history for user {user_id}")
 
+    def _append_to_journal(self, event):
+        if self.journal is not None and os.fstat(self.journal.fileno()).st_ino != self.journal_inode:
+            # Another process compacted the journal into a new file
+            self._sync()
+            self.journal.close()
+            self.journal = None
+        if self.journal is None:
+            prefix = ''
+            if not os.path.exists(USER_HISTORY_FILE) or os.path.getsize(USER_HISTORY_FILE) == 0:
+                prefix = ','.join(HISTORY_COLUMNS) + '\n'
+            else:
+                # Never glue the first event onto an unterminated last line
+                with open(USER_HISTORY_FILE, 'rb') as f:
+                    f.seek(-1, os.SEEK_END)
+                    if f.read(1) != b'\n':
+                        prefix = '\n'
+            self.journal = open(USER_HISTORY_FILE, 'a', newline='')
+            self.journal.write(prefix)
+            if self.tail is None:
+                self._open_tail(0)
+
+        user_id, movie_id, timestamp, rating, source = event
+        csv.writer(self.journal).writerow([
+            user_id, movie_id, format_timestamp(timestamp), '' if np.isnan(rating) else rating, source
+        ])
+        self.journal.flush()
+        # Our own rows are already in the index; follow from after them
+        self.journal_offset = os.fstat(self.journal.fileno()).st_size
+
+        # fsync in batches: a crash can lose at most the last few clicks
+        self.unsynced_events += 1
+        if (self.unsynced_events >= HISTORY_FSYNC_EVERY
+                or time.monotonic() - self.last_sync >= HISTORY_FSYNC_INTERVAL):
+            self._sync()
+
+    def _sync(self):
+        if self.journal is not None and self.unsynced_events:
+            os.fsync(self.journal.fileno())
+        self.unsynced_events = 0
+        self.last_sync = time.monotonic()
+
+    def flush(self):
+        """Force pending journal writes to disk"""
+        with self.lock:
+            self._sync()
+
+    def _open_tail(self, offset=None):
+        """Follow the current journal file from ``offset`` (default: its end)"""
+        if self.tail is not None:
+            self.tail.close()
+        try:
+            self.tail = open(USER_HISTORY_FILE, 'rb')
+        except FileNotFoundError:
+            self.tail, self.journal_inode, self.journal_offset = None, None, 0
+            return
+        stat = os.fstat(self.tail.fileno())
+        self.journal_inode = stat.st_ino
+        self.journal_offset = stat.st_size if offset is None else offset
+
+    def _read_tail(self):
+        """Events in the complete lines appended since the last read"""
+        if self.tail is None:
+            return []
+        # pread, not read: forked workers inherit this file and its position
+        fd = self.tail.fileno()
+        data = os.pread(fd, os.fstat(fd).st_size - self.journal_offset, self.journal_offset)
+        # A line still being written is picked up next time
+        end = data.rfind(b'\n') + 1
+        self.journal_offset += end
+        return parse_journal_lines(data[:end])
+
+    def _catch_up(self, lock_file=None):
+        """Apply events other processes appended to the journal; needs self.lock
+
+        ``lock_file`` is the journal_lock already held by the caller, if any.
+        """
+        try:
+            stat = os.stat(USER_HISTORY_FILE)
+        except FileNotFoundError:
+            return
+        if stat.st_ino == self.journal_inode and stat.st_size == self.journal_offset:
+            return
+
+        # Finish the file we were following; after a compaction nobody
+        # appends to it any more
+        events = self._read_tail()
+        self._apply(events)
+        if stat.st_ino != self.journal_inode:
+            if lock_file is None:
+                with journal_lock(shared=True) as shared_lock:
+                    new_events = self._follow_new_file(shared_lock)
+            else:
+                new_events = self._follow_new_file(lock_file)
+            self._apply(new_events)
+            events += new_events
+        if not events:
+            return
+
+        for listener in self.listeners:
+            try:
+                listener(events)
+            except Exception as e:
+                print(f"Error applying history events: {e}")
+
+    def _apply(self, events):
+        for event in events:
+            self.index.add(event)
+        self.uncompacted_rows += len(events)
+
+    def _follow_new_file(self, lock_file):
+        generation, inode, compacted_size = read_compaction_marker(lock_file)
+        try:
+            stat = os.stat(USER_HISTORY_FILE)
+        except FileNotFoundError:
+            return []
+        if inode == stat.st_ino and generation == self.journal_generation + 1:
+            # Compacted once by another process, from rows we have all read
+            self._open_tail(compacted_size)
+            self.journal_generation = generation
+            self.uncompacted_rows = 0
+            return self._read_tail()
+
+        # Created after we loaded, compacted more than once since we last
+        # looked, or replaced by hand: scan it all and keep what is new
+        self._open_tail(0)
+        if inode == stat.st_ino:
+            self.journal_generation = generation
+        newest = {}
+        events = []
+        for event in self._read_tail():
+            key = event[:2]
+            latest = newest.get(key, self.index.watched_at(*key))
+            if latest is None or event[2] > latest:
+                newest[key] = event[2]
+                events.append(event)
+        return events
+
+    def follow(self, interval=HISTORY_FOLLOW_INTERVAL):
+        """Poll the journal for other processes' events on a background thread
+
+        Reads catch up on their own; following also keeps listeners, such
+        as the recommender's fold-in, current in idle processes.
+        """
+        def run():
+            while True:
+                time.sleep(interval)
+                try:
+                    with self.lock:
+                        self._catch_up()
+                except Exception as e:
+                    print(f"Error following history journal: {e}")
+
+        self.follower = threading.Thread(target=run, name='history-follower', daemon=True)
+        self.follower.start()
+
+    def subscribe(self, listener):
+        """Call ``listener(events)`` with every batch of events other processes appended"""
+        self.listeners.append(listener)
+
+    def _compact(self, lock_file):
+        """Rewrite the journal with one row per user and movie; needs journal_lock held"""
+        self._sync()
+        if self.journal is not None:
+            self.journal.close()
+            self.journal = None
+
+        # The file, not this process's index, is the record of every process's events
+        history, _ = read_history_file()
+        history = history.sort_values('timestamp', kind='stable')
+        history = history.drop_duplicates(subset=['userId', 'movieId'], keep='last')
+        history['timestamp'] = pd.to_datetime(history['timestamp'], unit='s').dt.strftime(TIMESTAMP_FORMAT)
+
+        tmp_path = USER_HISTORY_FILE + '.tmp'
+        with open(tmp_path, 'w', newline='') as f:
+            history.to_csv(f, index=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, USER_HISTORY_FILE)
+        self.uncompacted_rows = 0
+
+        self._open_tail()
+        self.journal_generation = read_compaction_marker(lock_file)[0] + 1
+        lock_file.seek(0)
+        lock_file.truncate()
+        lock_file.write(f"{self.journal_generation} {self.journal_inode} {self.journal_offset}\n")
+        lock_file.flush()
+
     def get_user_history(self, user_id, limit=10):
         """Get complete watch history for a user"""
-        user_history = self.combined_history[self.combined_history['userId'] == user_id]
-        
-        if not user_history.empty:
-            user_history = user_history.sort_values('timestamp', ascending=False)
-        
-        return user_history.head(limit)
+        with self.lock:
+            self._catch_up()
+            return self.index.rows(-1 if user_id is None else int(user_id), limit)
 
     def save_additional_history(self):
-        """Save additional history to CSV"""
-        self.additional_history.to_csv('data/user_history.csv', index=False)
+        """Compact the history journal into user_history.csv"""
+        with self.lock, journal_lock() as lock_file:
+            self._catch_up(lock_file)
+            self._compact(lock_file)
 
     def get_user_stats(self, user_id):
         """Get statistics for a user's watch history"""
-        user_history = self.get_user_history(user_id, limit=None)
-        
-        if user_history.empty:
+        with self.lock:
+            self._catch_up()
+            stats = self.index.stats(-1 if user_id is None else int(user_id))
+
+        if stats is None:
             return {
                 'total_movies': 0,
                 'avg_rating': 0,
@@ -112,19 +552,4 @@ class UserHistory:
                 'app_count': 0,
                 'latest_watch': None
             }
-        
-        # Count by source
-        movielens_count = len(user_history[user_history['source'] == 'movielens'])
-        app_count = len(user_history[user_history['source'] == 'app'])
-        
-        # Calculate average rating (only for non-null ratings)
-        ratings = user_history['rating'].dropna()
-        avg_rating = ratings.mean() if len(ratings) > 0 else 0
-        
-        return {
-            'total_movies': len(user_history),
-            'avg_rating': avg_rating,
-            'movielens_count': movielens_count,
-            'app_count': app_count,
-            'latest_watch': user_history.iloc[0]['timestamp'] if not user_history.empty else None
-        }
\ No newline at end of file
+        return stats
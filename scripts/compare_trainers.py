@@ -0,0 +1,56 @@
+"""Compare the surprise SVD and NumPy ALS trainers on a held-out split
+
+Holds out a random fraction of the ratings, fits both trainers on the rest
+and prints fit time, RMSE and MAE side by side.
+
+    python -m scripts.compare_trainers [--test-size 0.2] [--ratings data/ratings.csv] [--seed 0]
+"""
+import argparse
+import time
+import numpy as np
+import pandas as pd
+from config.config import RATINGS_FILE
+from models.als import train_als
+from models.recommender import train_svd
+
+TRAINERS = {'svd': train_svd, 'als': train_als}
+
+
+def holdout_split(ratings, test_size=0.2, seed=0):
+    rng = np.random.default_rng(seed)
+    is_test = rng.random(len(ratings)) < test_size
+    return ratings[~is_test], ratings[is_test]
+
+
+def evaluate(factors, test):
+    errors = factors.predict(test['userId'].to_numpy(), test['movieId'].to_numpy()) - test['rating'].to_numpy()
+    return float(np.sqrt(np.mean(errors ** 2))), float(np.mean(np.abs(errors)))
+
+
+def compare(ratings, test_size=0.2, seed=0, trainers=TRAINERS):
+    train, test = holdout_split(ratings, test_size, seed)
+    results = []
+    for name, train_fn in trainers.items():
+        started = time.time()
+        factors = train_fn(train)
+        duration = time.time() - started
+        rmse, mae = evaluate(factors, test)
+        results.append({'trainer': name, 'fit_seconds': round(duration, 2),
+                        'rmse': round(rmse, 4), 'mae': round(mae, 4)})
+    return pd.DataFrame(results)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--ratings', default=RATINGS_FILE)
+    parser.add_argument('--test-size', type=float, default=0.2)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    ratings = pd.read_csv(args.ratings, usecols=['userId', 'movieId', 'rating'])
+    print(f"{len(ratings)} ratings, holding out {args.test_size:.0%}")
+    print(compare(ratings, args.test_size, args.seed).to_string(index=False))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,297 @@
+"""Offline evaluation of the recommender and similarity modes
+
+Scores the configured trainer (over an optional parameter grid) and the
+content, hybrid and collaborative similarity modes on a random k-fold split
+and a time split that holds out the latest ratings. Reports RMSE and MAE of
+held-out ratings plus precision@k, recall@k, NDCG@k and catalog coverage of
+the rankings the app would serve.
+
+The splits are computed once and saved as .npy fold arrays next to the
+results; workers memory-map them along with the ratings cache, so only task
+descriptions travel to the process pool. Every (split, fold, grid point)
+is its own task.
+
+    python -m scripts.evaluate [--splits random time] [--grid n_factors=50,100 reg_all=0.02,0.05]
+                               [--models content hybrid] [--workers 4] [--output data/eval/results]
+"""
+import argparse
+import itertools
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from config.config import (TRAINER, SVD_PARAMS, ALS_PARAMS, EVAL_DIR, EVAL_FOLDS, EVAL_TEST_SIZE, EVAL_K,
+                           EVAL_RELEVANT_RATING, EVAL_MAX_USERS, EVAL_WORKERS)
+from models.ratings import load_rating_columns
+
+SPLITS = ['random', 'time']
+SIMILARITY_MODELS = ['content', 'hybrid']
+METRICS = ['rmse', 'mae', 'precision', 'recall', 'ndcg', 'coverage']
+
+
+def make_splits(columns, n_folds=EVAL_FOLDS, test_size=EVAL_TEST_SIZE, seed=0):
+    """{name: fold of every rating}; -1 marks rows that are only ever trained on
+
+    'random' assigns each rating to one of n_folds folds. 'time' holds out
+    the latest ``test_size`` share of ratings as a single fold.
+    """
+    rng = np.random.default_rng(seed)
+    timestamps = columns['timestamp']
+    cutoff = np.quantile(timestamps, 1 - test_size)
+    return {
+        'random': rng.integers(0, n_folds, len(timestamps)).astype(np.int8),
+        'time': np.where(timestamps >= cutoff, 0, -1).astype(np.int8),
+    }
+
+
+def save_splits(splits, directory):
+    os.makedirs(directory, exist_ok=True)
+    paths = {}
+    for name, folds in splits.items():
+        paths[name] = os.path.join(directory, f"{name}.npy")
+        np.save(paths[name], folds)
+    return paths
+
+
+def ranking_metrics(ranked, relevant, k):
+    """Precision, recall and NDCG at k of movie id rankings against relevant sets"""
+    precision, recall, ndcg = [], [], []
+    discounts = 1 / np.log2(np.arange(2, k + 2))
+    for movie_ids, targets in zip(ranked, relevant):
+        hits = np.isin(movie_ids[:k], list(targets))
+        precision.append(hits.sum() / k)
+        recall.append(hits.sum() / len(targets))
+        ideal = discounts[:min(k, len(targets))].sum()
+        ndcg.append(discounts[:len(hits)][hits].sum() / ideal)
+    return {'precision': float(np.mean(precision)), 'recall': float(np.mean(recall)),
+            'ndcg': float(np.mean(ndcg))}
+
+
+# Per-worker state, set up once by _init_worker
+_worker = {}
+
+
+def _init_worker(split_paths, als_workers):
+    from models.catalog import MovieCatalog
+    catalog = MovieCatalog()
+    catalog.load_data()
+    _worker.update(
+        columns=load_rating_columns(mmap_mode='r'),
+        splits={name: np.load(path, mmap_mode='r') for name, path in split_paths.items()},
+        catalog=catalog,
+        als_workers=als_workers,
+        similarity={},
+    )
+
+
+def _similarity_model(name):
+    """Content and hybrid models do not depend on the split; load each once per worker
+
+    Content rankings order movies within a genre class by their rating count
+    over all ratings, a small leak of held-out data into that tie-break.
+    """
+    from models.similarity import ItemSimilarity, HybridSimilarity
+    model = _worker['similarity'].get(name)
+    if model is None:
+        cls = ItemSimilarity if name == 'content' else HybridSimilarity
+        model = _worker['similarity'][name] = cls(None, _worker['catalog'])
+        model.load_data()
+    return model
+
+
+def fold_data(split, fold):
+    """Training ratings and the held-out ratings of one fold"""
+    folds = _worker['splits'][split]
+    is_test = folds == fold
+    ratings = pd.DataFrame({name: _worker['columns'][name] for name in ('userId', 'movieId', 'rating', 'timestamp')})
+    return ratings[~is_test], ratings[is_test]
+
+
+def ranking_users(train, test, max_users=EVAL_MAX_USERS, seed=0):
+    """{userId: relevant held-out movie ids} for sampled users known at training time"""
+    relevant = test[(test['rating'] >= EVAL_RELEVANT_RATING) & test['userId'].isin(train['userId'])]
+    targets = relevant.groupby('userId')['movieId'].agg(set)
+    if max_users is not None and len(targets) > max_users:
+        targets = targets.sample(max_users, random_state=seed)
+    return targets.to_dict()
+
+
+def similarity_queries(train, users):
+    """Each user's latest well-rated training movie, the seed for similarity rankings"""
+    train = train[train['userId'].isin(users)].sort_values(['userId', 'timestamp'], kind='stable')
+    liked = train[train['rating'] >= EVAL_RELEVANT_RATING].groupby('userId')['movieId'].last()
+    # Users without a liked movie fall back to their latest one
+    return liked.combine_first(train.groupby('userId')['movieId'].last()).astype(np.int64)
+
+
+def rank_similar(model, train_by_user, queries, k):
+    """Top-k movie ids similar to each user's seed, minus movies they trained on"""
+    catalog = _worker['catalog']
+    ranked = {}
+    for user_id, movie_id in queries.items():
+        seen = train_by_user.get(user_id, set())
+        position = catalog.position(movie_id)
+        if position < 0:
+            ranked[user_id] = np.empty(0, dtype=np.int64)
+            continue
+        positions, _ = model.ranked_similar(position, k + len(seen))
+        movie_ids = catalog.movie_ids[positions]
+        ranked[user_id] = movie_ids[~np.isin(movie_ids, list(seen))][:k]
+    return ranked
+
+
+def score_rankings(ranked, targets, k):
+    users = list(targets)
+    scores = ranking_metrics([ranked[u] for u in users], [targets[u] for u in users], k)
+    recommended = np.unique(np.concatenate([ranked[u] for u in users])) if users else []
+    scores['coverage'] = len(recommended) / len(_worker['catalog'])
+    scores['users'] = len(users)
+    return scores
+
+
+def evaluate_task(task):
+    """Rows of metrics for one (split, fold, model, params) task"""
+    from models.recommender import MovieRecommender, train_svd
+    from models.als import train_als
+    from models.similarity import FactorSimilarity
+
+    started = time.perf_counter()
+    k = task['k']
+    train, test = fold_data(task['split'], task['fold'])
+    targets = ranking_users(train, test, task['max_users'], seed=task['fold'])
+    train_by_user = train[train['userId'].isin(targets)].groupby('userId')['movieId'].agg(set).to_dict()
+    base = {'split': task['split'], 'fold': task['fold'], 'params': json.dumps(task['params'], sort_keys=True)}
+
+    if task['model'] in SIMILARITY_MODELS:
+        model = _similarity_model(task['model'])
+        ranked = rank_similar(model, train_by_user, similarity_queries(train, list(targets)), k)
+        return [{**base, 'model': task['model'], **score_rankings(ranked, targets, k),
+                 'seconds': round(time.perf_counter() - started, 3)}]
+
+    fit_started = time.perf_counter()
+    if task['model'] == 'als':
+        factors = train_als(train, workers=_worker['als_workers'], **task['params'])
+    else:
+        # Seeded so grid points and repeated runs differ only by their parameters
+        factors = train_svd(train, params={'random_state': task['seed'], **task['params']})
+    fit_seconds = time.perf_counter() - fit_started
+
+    errors = factors.predict(test['userId'].to_numpy(), test['movieId'].to_numpy()) - test['rating'].to_numpy()
+    recommender = MovieRecommender(None, _worker['catalog'])
+    recommender.set_factors(factors)
+    catalog_ids = _worker['catalog'].movie_ids
+    ranked = {user_id: catalog_ids[recommender.rank_items(user_id, k)[0]] for user_id in targets}
+    rows = [{**base, 'model': task['model'],
+             'rmse': float(np.sqrt(np.mean(errors ** 2))), 'mae': float(np.mean(np.abs(errors))),
+             **score_rankings(ranked, targets, k), 'fit_seconds': round(fit_seconds, 3)}]
+
+    collaborative = FactorSimilarity(None, _worker['catalog'], recommender)
+    ranked = rank_similar(collaborative, train_by_user, similarity_queries(train, list(targets)), k)
+    rows.append({**base, 'model': 'collaborative', **score_rankings(ranked, targets, k)})
+    for row in rows:
+        row['seconds'] = round(time.perf_counter() - started, 3)
+    return rows
+
+
+def parse_grid(items):
+    """['n_factors=50,100', 'reg_all=0.02'] -> every combination as a list of dicts"""
+    names, values = [], []
+    for item in items or []:
+        name, _, options = item.partition('=')
+        names.append(name)
+        values.append([json.loads(option) for option in options.split(',')])
+    return [dict(zip(names, point)) for point in itertools.product(*values)]
+
+
+def build_tasks(splits, grid, trainer, models, k, max_users, seed=0):
+    tasks = []
+    for split, folds in splits.items():
+        for fold in range(int(folds.max()) + 1):
+            for params in grid:
+                tasks.append({'split': split, 'fold': fold, 'model': trainer, 'params': params,
+                              'k': k, 'max_users': max_users, 'seed': seed})
+            for model in models:
+                tasks.append({'split': split, 'fold': fold, 'model': model, 'params': {},
+                              'k': k, 'max_users': max_users, 'seed': seed})
+    return tasks
+
+
+def run_tasks(tasks, split_paths, workers):
+    """Results of every task, across a spawn process pool when workers > 1"""
+    if workers <= 1:
+        _init_worker(split_paths, ALS_PARAMS['workers'])
+        return [row for task in tasks for row in evaluate_task(task)]
+    # Each process runs one task at a time, so ALS gets a share of the cores
+    als_workers = max(1, (os.cpu_count() or 1) // workers)
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+                             initializer=_init_worker, initargs=(split_paths, als_workers)) as executor:
+        return [row for rows in executor.map(evaluate_task, tasks) for row in rows]
+
+
+def summarize(results):
+    """Metrics averaged over folds for each split, model and grid point"""
+    frame = pd.DataFrame(results)
+    metrics = [name for name in METRICS if name in frame]
+    return frame.groupby(['split', 'model', 'params'], sort=True)[metrics].mean().reset_index()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--splits', nargs='+', default=SPLITS, choices=SPLITS)
+    parser.add_argument('--folds', type=int, default=EVAL_FOLDS, help="folds of the random split")
+    parser.add_argument('--test-size', type=float, default=EVAL_TEST_SIZE, help="held-out share of the time split")
+    parser.add_argument('--trainer', default=TRAINER, choices=['svd', 'als'])
+    parser.add_argument('--grid', nargs='*', metavar='PARAM=V1,V2',
+                        help="trainer parameters to sweep; every combination is evaluated")
+    parser.add_argument('--models', nargs='*', default=SIMILARITY_MODELS, choices=SIMILARITY_MODELS,
+                        help="similarity modes besides collaborative, which comes with every trainer run")
+    parser.add_argument('--k', type=int, default=EVAL_K)
+    parser.add_argument('--max-users', type=int, default=EVAL_MAX_USERS, help="test users ranked per fold")
+    parser.add_argument('--workers', type=int, default=EVAL_WORKERS)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default=os.path.join(EVAL_DIR, 'results'),
+                        help="writes <output>.json with every fold and <output>.csv averaged over folds")
+    args = parser.parse_args()
+
+    started = time.time()
+    columns = load_rating_columns()
+    splits = make_splits(columns, args.folds, args.test_size, args.seed)
+    splits = {name: folds for name, folds in splits.items() if name in args.splits}
+    split_paths = save_splits(splits, os.path.join(EVAL_DIR, 'splits'))
+
+    if 'hybrid' in args.models:
+        # Build (or validate) the saved hybrid index once, before the workers load it
+        from models.catalog import MovieCatalog
+        from models.similarity import HybridSimilarity
+        catalog = MovieCatalog()
+        catalog.load_data()
+        HybridSimilarity(None, catalog).load_data()
+
+    grid = parse_grid(args.grid) or [{}]
+    tasks = build_tasks(splits, grid, args.trainer, args.models, args.k, args.max_users, args.seed)
+    print(f"{len(columns['rating'])} ratings, {len(tasks)} tasks on {args.workers} workers...")
+    results = run_tasks(tasks, split_paths, args.workers)
+    duration = time.time() - started
+
+    summary = summarize(results)
+    os.makedirs(os.path.dirname(args.output) or '.', exist_ok=True)
+    with open(args.output + '.json', 'w') as f:
+        json.dump({
+            'meta': {'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'), 'seconds': round(duration, 1),
+                     'trainer': args.trainer,
+                     'base_params': SVD_PARAMS if args.trainer == 'svd' else ALS_PARAMS,
+                     **{name: getattr(args, name) for name in ('splits', 'folds', 'test_size', 'k', 'max_users',
+                                                               'workers', 'seed')},
+                     'relevant_rating': EVAL_RELEVANT_RATING},
+            'results': results,
+        }, f, indent=2)
+    summary.to_csv(args.output + '.csv', index=False)
+    print(summary.to_string(index=False, float_format=lambda value: f"{value:.4f}"))
+    print(f"Wrote {args.output}.json and {args.output}.csv in {duration:.1f}s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,37 @@
+"""Precompute the top-N recommendations of every user
+
+Scores all users against all movies in blocked matrix products with the
+current model artifact and writes a memory-mapped top-K table to
+PRECOMPUTED_DIR. The app serves from it while the model version matches and
+falls back to live scoring otherwise, so rerun it after every retrain.
+
+    python -m scripts.precompute_recommendations [--k 100] [--block-size 1024]
+"""
+import argparse
+import time
+from config.config import PRECOMPUTED_DIR, PRECOMPUTED_K, PRECOMPUTED_BLOCK_SIZE
+from models.catalog import MovieCatalog
+from models.precomputed import precompute_top_k
+from models.recommender import MovieRecommender
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--output', default=PRECOMPUTED_DIR)
+    parser.add_argument('--k', type=int, default=PRECOMPUTED_K)
+    parser.add_argument('--block-size', type=int, default=PRECOMPUTED_BLOCK_SIZE)
+    args = parser.parse_args()
+
+    catalog = MovieCatalog()
+    catalog.load_data()
+    recommender = MovieRecommender(None, catalog)
+    recommender.load_data()
+
+    started = time.time()
+    manifest = precompute_top_k(recommender.serving, catalog, args.output, args.k, args.block_size)
+    print(f"Wrote top-{manifest['k']} for {manifest['n_users']} users of model {manifest['model_version']} "
+          f"to {args.output} in {time.time() - started:.1f}s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+"""Warm up TMDB metadata for every movie in links.csv
+
+Fetches movies by tmdbId in concurrent, rate-limited batches and appends
+them to TMDB_METADATA_FILE, which the app loads at startup. Movies already in
+the file are skipped, so an interrupted run resumes where it stopped.
+
+    python -m scripts.prefetch_metadata [--batch-size 200] [--limit N] [--refresh]
+"""
+import argparse
+import json
+import os
+import time
+from config.config import TMDB_METADATA_FILE
+from models.tmdb_api import TMDBApi, load_metadata_file
+
+
+def prefetch(api, path=TMDB_METADATA_FILE, batch_size=200, limit=None, refresh=False):
+    """Fetch every catalog movie missing from ``path`` and append it there"""
+    if refresh and os.path.exists(path):
+        os.remove(path)
+    done = load_metadata_file(path)
+    pending = [movie_id for movie_id in api.tmdb_ids if movie_id not in done]
+    if limit is not None:
+        pending = pending[:limit]
+    print(f"{len(done)} movies already prefetched, {len(pending)} to go")
+
+    fetched = failed = 0
+    started = time.time()
+    with open(path, 'a') as f:
+        for start in range(0, len(pending), batch_size):
+            batch = pending[start:start + batch_size]
+            futures = [(movie_id, api.executor.submit(api.fetch_movie, movie_id)) for movie_id in batch]
+
+            for movie_id, future in futures:
+                try:
+                    info, found = future.result()
+                except Exception as e:
+                    # Left out of the file so the next run retries it
+                    print(f"Error fetching movie {movie_id}: {e}")
+                    failed += 1
+                    continue
+                record = {'movieId': movie_id, 'tmdbId': api.tmdb_ids[movie_id], 'found': found, 'info': info}
+                f.write(json.dumps(record, separators=(',', ':')) + '\n')
+                fetched += 1
+
+            # Make every finished batch durable before starting the next one
+            f.flush()
+            os.fsync(f.fileno())
+            print(f"{fetched + failed}/{len(pending)} processed ({time.time() - started:.0f}s)")
+
+    print(f"Prefetched {fetched} movies, {failed} failed")
+    return fetched, failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--output', default=TMDB_METADATA_FILE)
+    parser.add_argument('--batch-size', type=int, default=200)
+    parser.add_argument('--limit', type=int, default=None, help="only fetch this many movies")
+    parser.add_argument('--refresh', action='store_true', help="discard the existing file first")
+    args = parser.parse_args()
+
+    api = TMDBApi(metadata_file=None, offline=False)
+    prefetch(api, args.output, args.batch_size, args.limit, args.refresh)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,222 @@
+"""Process-wide counters, latency histograms and a slow-request profiler
+
+Metrics are plain in-memory aggregates behind one lock, cheap enough for
+every request, and are rendered in the Prometheus text format by /metrics.
+Each process keeps its own registry; under gunicorn every worker labels its
+series with ``worker=<pid>``, so scrapes that land on different workers stay
+distinguishable and totals are sums over that label.
+
+    with timer('stage_seconds', stage='scoring'):
+        ...
+    increment('tmdb_requests_total', status='200')
+"""
+import bisect
+import collections
+import functools
+import sys
+import threading
+import time
+from config.config import METRICS_PREFIX, PROFILE_SLOW_REQUESTS, SLOW_REQUEST_SECONDS, PROFILE_SAMPLE_INTERVAL
+
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class Histogram:
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Registry:
+    """Counters and histograms keyed by name and label set, plus gauges from collectors"""
+
+    def __init__(self, prefix=METRICS_PREFIX):
+        self.prefix = prefix
+        self.lock = threading.Lock()
+        self.counters = collections.defaultdict(float)
+        self.histograms = {}
+        # Callables returning [(name, labels, value)], evaluated on scrape
+        self.collectors = []
+        # Added to every rendered series, e.g. the worker process
+        self.labels = ()
+
+    def increment(self, name, amount=1, **labels):
+        with self.lock:
+            self.counters[(name, tuple(sorted(labels.items())))] += amount
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram()
+            histogram.observe(value)
+
+    def add_collector(self, collector):
+        self.collectors.append(collector)
+
+    def set_labels(self, **labels):
+        """Labels rendered on every series of this registry"""
+        self.labels = tuple(sorted(labels.items()))
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format"""
+        with self.lock:
+            counters = dict(self.counters)
+            histograms = {key: (list(h.counts), h.sum, h.count, h.buckets) for key, h in self.histograms.items()}
+        gauges = {}
+        for collector in self.collectors:
+            try:
+                for name, labels, value in collector():
+                    gauges[(name, tuple(sorted(labels.items())))] = value
+            except Exception as e:
+                print(f"Error collecting metrics: {e}")
+
+        lines = []
+        for kind, values in (('counter', counters), ('gauge', gauges)):
+            for name in sorted({name for name, _ in values}):
+                self._header(lines, name, kind)
+                for (metric, labels), value in sorted(values.items()):
+                    if metric == name:
+                        lines.append(f"{self.prefix}{name}{_labels(self.labels + labels)} {value:g}")
+
+        for name in sorted({name for name, _ in histograms}):
+            self._header(lines, name, 'histogram')
+            for (metric, labels), (counts, total, count, buckets) in sorted(histograms.items()):
+                if metric != name:
+                    continue
+                labels = self.labels + labels
+                cumulative = 0
+                for bound, bucket_count in zip(list(buckets) + ['+Inf'], counts):
+                    cumulative += bucket_count
+                    le = bound if bound == '+Inf' else f"{bound:g}"
+                    lines.append(f"{self.prefix}{name}_bucket{_labels(labels + (('le', le),))} {cumulative}")
+                lines.append(f"{self.prefix}{name}_sum{_labels(labels)} {total:.6f}")
+                lines.append(f"{self.prefix}{name}_count{_labels(labels)} {count}")
+        return '\n'.join(lines) + '\n'
+
+    def _header(self, lines, name, kind):
+        lines.append(f"# TYPE {self.prefix}{name} {kind}")
+
+
+def _labels(labels):
+    if not labels:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in labels)
+    return '{' + ','.join(f'{key}="{value}"' for (key, _), value in zip(labels, escaped)) + '}'
+
+
+class SlowRequestProfiler:
+    """Samples the stacks of requests in flight and reports slow ones
+
+    A single daemon thread wakes every ``interval`` seconds and records the
+    current stack of each profiled thread. When a profiled block takes
+    longer than ``threshold`` its most frequent stacks are printed. Costs
+    nothing unless enabled.
+    """
+
+    def __init__(self, threshold=SLOW_REQUEST_SECONDS, interval=PROFILE_SAMPLE_INTERVAL, depth=12):
+        self.threshold = threshold
+        self.interval = interval
+        self.depth = depth
+        self.active = {}  # thread id -> Counter of sampled stacks
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            with self.lock:
+                if not self.active:
+                    continue
+                frames = sys._current_frames()
+                for thread_id, samples in self.active.items():
+                    frame = frames.get(thread_id)
+                    stack = []
+                    while frame is not None and len(stack) < self.depth:
+                        code = frame.f_code
+                        stack.append(f"{code.co_filename.rsplit('/', 1)[-1]}:{frame.f_lineno} {code.co_name}")
+                        frame = frame.f_back
+                    samples[tuple(stack)] += 1
+
+    def start(self, name):
+        thread_id = threading.get_ident()
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name='slow-request-profiler', daemon=True)
+                self.thread.start()
+            self.active[thread_id] = collections.Counter()
+        return thread_id
+
+    def stop(self, thread_id, name, duration):
+        with self.lock:
+            samples = self.active.pop(thread_id, None)
+        if samples is None or duration < self.threshold:
+            return
+        registry.increment('slow_requests_total', handler=name)
+        print(f"Slow request {name}: {duration * 1000:.0f} ms, {sum(samples.values())} samples")
+        for stack, count in samples.most_common(3):
+            print(f"  {count} samples:")
+            for line in stack:
+                print(f"    {line}")
+
+
+registry = Registry()
+profiler = SlowRequestProfiler() if PROFILE_SLOW_REQUESTS else None
+
+
+def increment(name, amount=1, **labels):
+    registry.increment(name, amount, **labels)
+
+
+def observe(name, value, **labels):
+    registry.observe(name, value, **labels)
+
+
+class timer:
+    """Context manager recording the elapsed seconds into a histogram"""
+
+    def __init__(self, name, **labels):
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.elapsed = time.perf_counter() - self.started
+        registry.observe(self.name, self.elapsed, **self.labels)
+
+
+def timed_request(name):
+    """Decorator for request handlers: latency histogram, error count and,
+    when PROFILE_SLOW_REQUESTS is set, stack samples of slow calls"""
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            token = profiler.start(name) if profiler is not None else None
+            started = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            except Exception:
+                registry.increment('request_errors_total', handler=name)
+                raise
+            finally:
+                duration = time.perf_counter() - started
+                registry.observe('request_seconds', duration, handler=name)
+                if token is not None:
+                    profiler.stop(token, name, duration)
+        return wrapper
+    return decorator
+
+
+def metrics_text():
+    return registry.render()
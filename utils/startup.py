@@ -0,0 +1,108 @@
+"""Background warm-up of the models behind the app
+
+Steps run in order on one background thread and store what they load as
+attributes of the Warmup object, so the web server can bind before any
+model is ready. Callbacks and /readyz check readiness per step.
+
+    services = Warmup()
+
+    @services.step('catalog')
+    def load_catalog():
+        services.catalog = ...
+
+    services.start()
+"""
+import threading
+import time
+import traceback
+from utils.metrics import observe
+
+PENDING, LOADING, READY, FAILED = 'pending', 'loading', 'ready', 'failed'
+
+
+class Warmup:
+    def __init__(self):
+        self.steps = []  # (name, function, required steps)
+        self.status = {}
+        self.errors = {}
+        self.durations = {}
+        self.done = threading.Event()
+        self.started = False
+        self.thread = None
+
+    def step(self, name, requires=()):
+        """Decorator registering a loading step; steps run in registration order"""
+        def decorator(function):
+            self.steps.append((name, function, tuple(requires)))
+            self.status[name] = PENDING
+            return function
+        return decorator
+
+    def run(self, raise_errors=False):
+        started = time.perf_counter()
+        for name, function, requires in self.steps:
+            missing = [required for required in requires if self.status.get(required) != READY]
+            if missing:
+                # Never serve a step whose inputs failed to load
+                self.status[name] = FAILED
+                self.errors[name] = f"requires {', '.join(missing)}"
+                continue
+
+            self.status[name] = LOADING
+            step_started = time.perf_counter()
+            try:
+                function()
+            except Exception as e:
+                self.status[name] = FAILED
+                self.errors[name] = str(e)
+                if raise_errors:
+                    raise
+                print(f"Warm-up step {name} failed: {e}")
+                traceback.print_exc()
+            else:
+                self.status[name] = READY
+            self.durations[name] = time.perf_counter() - step_started
+            observe('warmup_seconds', self.durations[name], step=name)
+
+        print(f"Warm-up finished in {time.perf_counter() - started:.1f}s")
+        self.done.set()
+
+    def start(self, background=True):
+        """Run every step, on a daemon thread unless ``background`` is False
+
+        Only the first call loads anything.
+        """
+        if self.started:
+            return self
+        self.started = True
+        if not background:
+            self.run(raise_errors=True)
+            return self
+        self.thread = threading.Thread(target=self.run, name='warmup', daemon=True)
+        self.thread.start()
+        return self
+
+    def ready(self, *names):
+        """True once the named steps (all steps by default) have loaded"""
+        return all(self.status.get(name) == READY for name in names or self.status)
+
+    def wait(self, timeout=None):
+        """Block until every step has finished or failed"""
+        return self.done.wait(timeout)
+
+    def report(self):
+        return {
+            'ready': self.ready(),
+            'steps': {
+                name: {
+                    'status': status,
+                    'seconds': round(self.durations[name], 3) if name in self.durations else None,
+                    **({'error': self.errors[name]} if name in self.errors else {}),
+                }
+                for name, status in self.status.items()
+            },
+        }
+
+    def metrics(self):
+        """Collector for utils.metrics: 1 for every ready step, 0 otherwise"""
+        return [('warmup_ready', {'step': name}, int(status == READY)) for name, status in self.status.items()]